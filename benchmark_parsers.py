@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import sys
+import time
+import argparse
+from pathlib import Path
+import wp_cloner_json_format as cloner
+
+BACKENDS = ['html.parser', 'lxml', 'fast']
+
+# Minified pages often drop attribute quotes; unquoted values may still contain '=' in their query
+UNQUOTED_SAMPLE = (b'<html><head><title>t</title><link rel=stylesheet href=/wp-content/themes/t/style.css?ver=6.5>'
+                   b'</head><body><a href=/blog/?paged=2>Next</a><img src=/wp-content/uploads/a.png?w=300&h=200 alt=x>'
+                   b'</body></html>')
+
+def load_pages(pages_root):
+    """Read every saved HTML page under pages_root as bytes, the way the crawler hands them to the parser."""
+    pages = []
+    for path in sorted(Path(pages_root).rglob('*.html')):
+        pages.append((path, path.read_bytes()))
+    return pages
+
+def page_url(path, pages_root, base_url):
+    """Rebuild the original URL of a saved page from its location on disk."""
+    rel = path.relative_to(pages_root).parent.as_posix()
+    return base_url.rstrip('/') + '/' + ('' if rel == '.' else rel + '/')
+
+def run_backend(backend, pages, pages_root, base_url, with_xml):
+    """Run parse_page over all pages once; return elapsed seconds and per-page results."""
+    cloner.CONFIG['parser_backend'] = backend
+    # Splice mode sends every backend through the scanner, so tree backends are timed re-serializing their tree
+    cloner.CONFIG['rewrite_mode'] = 'splice' if backend == 'fast' else 'prettify'
+    cloner.CONFIG['generate_xml'] = with_xml
+    base_domain = cloner.urlparse(base_url).netloc.lower()
+    results = []
+    start = time.perf_counter()
+    for path, body in pages:
+        url = page_url(path, pages_root, base_url)
+        _, links, assets, _ = cloner.parse_page(url, body, base_domain, pages_root, path,
+                                                charset=cloner.sniff_charset(body))
+        results.append((sorted(links), sorted(a[0] for a in assets)))
+    return time.perf_counter() - start, results
+
+def check_unquoted(pages_root, base_url):
+    """Parse UNQUOTED_SAMPLE with the scanner and with html.parser; True if links, assets and rewritten links agree."""
+    base_domain = cloner.urlparse(base_url).netloc.lower()
+    path = Path(pages_root) / 'index.html'
+    results = []
+    for backend, mode in (('html.parser', 'prettify'), ('fast', 'splice')):
+        cloner.CONFIG.update(parser_backend=backend, rewrite_mode=mode, generate_xml=False)
+        rewritten, links, assets, _ = cloner.parse_page(base_url, UNQUOTED_SAMPLE, base_domain, pages_root, path,
+                                                        charset='utf-8')
+        asset_elements, _, _, _ = cloner.visit_page(cloner.make_soup(rewritten, 'utf-8'))
+        results.append((sorted(links), sorted(assets), sorted(element[attr] for element, attr in asset_elements)))
+    return results[0] == results[1]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML parser backends on saved pages.')
+    parser.add_argument('pages_root', nargs='?', default='wp_clone', help='Directory of saved pages to parse')
+    parser.add_argument('--base-url', default=cloner.DEFAULT_CONFIG['base_url'], help='Site the pages were cloned from')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per backend; the fastest is reported')
+    args = parser.parse_args()
+
+    cloner.CONFIG = cloner.DEFAULT_CONFIG.copy()
+    pages_root = Path(args.pages_root)
+    pages = load_pages(pages_root)
+    if not pages:
+        print(f"No HTML pages found under {pages_root}", file=sys.stderr)
+        sys.exit(1)
+    total_mb = sum(len(body) for _, body in pages) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.1f} MB from {pages_root}")
+
+    print(f"scanner matches html.parser on unquoted attributes: {check_unquoted(pages_root, args.base_url)}")
+    cloner.CONFIG = cloner.DEFAULT_CONFIG.copy()
+    reference = None
+    print(f"{'backend':<12} {'rewrite s':>10} {'+ WXR s':>10} {'pages/s':>9}  matches html.parser")
+    for backend in BACKENDS:
+        if backend == 'lxml' and not cloner.HAVE_LXML:
+            print(f"{backend:<12} skipped (lxml not installed)")
+            continue
+        rewrite = min(run_backend(backend, pages, pages_root, args.base_url, False)[0] for _ in range(args.repeat))
+        full, results = min((run_backend(backend, pages, pages_root, args.base_url, True) for _ in range(args.repeat)),
+                            key=lambda r: r[0])
+        if reference is None:
+            reference = results
+        print(f"{backend:<12} {rewrite:>10.3f} {full:>10.3f} {len(pages) / rewrite:>9.1f}  {results == reference}")
+
+if __name__ == '__main__':
+    main()
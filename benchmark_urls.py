@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import re
+import sys
+import time
+import argparse
+from collections import Counter
+from pathlib import Path
+import wp_cloner_json_format as cloner
+
+URL_RE = re.compile(r'https?://[^\s\'"<>]+')
+
+def load_urls(log_file):
+    """Collect every URL mentioned in a crawl log, in order of appearance."""
+    text = Path(log_file).read_text(encoding='utf-8', errors='replace')
+    return [url.rstrip('.,:;)') for url in URL_RE.findall(text)]
+
+def scan_asset(url, base_domain):
+    """The previous per-element check: an endswith scan over asset types, then every exclude pattern."""
+    if not any(url.endswith(ext) for ext in cloner.CONFIG['asset_types']):
+        return False
+    if any(re.match(pat, url) for pat in cloner.CONFIG['exclude_patterns']):
+        return False
+    return cloner.is_valid_url(url, base_domain)
+
+def timed(func, urls, base_domain, repeat):
+    """Run func over all URLs repeat times; return the best time and the last results."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(url, base_domain) for url in urls]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compiled URL classifier on URLs from a crawl log.')
+    parser.add_argument('log_file', nargs='?', default='wp_clone.log', help='Crawl log to take URLs from')
+    parser.add_argument('--base-url', default=cloner.DEFAULT_CONFIG['base_url'], help='Site the log was produced for')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per matcher; the fastest is reported')
+    args = parser.parse_args()
+
+    cloner.CONFIG = cloner.DEFAULT_CONFIG.copy()
+    urls = load_urls(args.log_file)
+    if not urls:
+        print(f"No URLs found in {args.log_file}", file=sys.stderr)
+        sys.exit(1)
+    base_domain = cloner.urlparse(args.base_url).netloc.lower()
+    print(f"{len(urls)} URLs ({len(set(urls))} unique) from {args.log_file}")
+
+    scan, scan_results = timed(scan_asset, urls, base_domain, args.repeat)
+    classifier = cloner.url_classifier()
+    classify, classes = timed(lambda url, domain: cloner.classify_url(url, domain, classifier), urls, base_domain, args.repeat)
+    print(f"{'matcher':<12} {'total ms':>9} {'us/url':>8}")
+    for name, elapsed in (('scan', scan), ('classifier', classify)):
+        print(f"{name:<12} {elapsed * 1000:>9.2f} {elapsed / len(urls) * 1e6:>8.2f}")
+    print('classes: ' + ', '.join(f"{name}={count}" for name, count in Counter(classes).most_common()))
+    # The classifier also sees ?ver= assets and matches case-insensitively, so report where they differ
+    differ = sorted({url for url, old, new in zip(urls, scan_results, classes) if old != (new == 'asset')})
+    print(f"asset decisions differing from the scan: {len(differ)}")
+    for url in differ[:10]:
+        print(f"  {url}")
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,11 @@ import sys
 import asyncio
 import aiohttp
 from urllib.parse import urljoin, urlparse, urlunparse, urldefrag, unquote
-from collections import deque
 import logging
 from pathlib import Path
 import re
+import hashlib
+from collections import Counter
 try:
     from bs4 import BeautifulSoup
     import xml.etree.ElementTree as ET
@@ -28,6 +29,10 @@ CONFIG = {
     'user_agent': 'Mozilla/5.0 (compatible; SiteCloner/2.0)',
     'follow_sitemap': True,
     'fetch_json': True,  # Try to fetch JSON API endpoints
+    'pool_size': 100,  # Total pooled keep-alive connections
+    'pool_size_per_host': 32,  # Pooled connections per host
+    'keepalive_timeout': 30,  # Seconds an idle pooled connection is kept open
+    'dns_cache_ttl': 300,  # Seconds to cache DNS lookups
 }
 
 # Setup logging
@@ -61,6 +66,24 @@ def is_valid_url(url, base_domain):
     parsed = urlparse(url)
     return parsed.netloc.lower() == base_domain
 
+def url_fingerprint(url):
+    """Return a compact 64-bit fingerprint of a normalized URL."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def enqueue_url(url, base_domain, queue, seen):
+    """Queue a URL once, deduplicating on its fingerprint and enforcing max_pages."""
+    norm_url = normalize_url(url)
+    if not norm_url or not is_valid_url(norm_url, base_domain):
+        return False
+    fingerprint = url_fingerprint(norm_url)
+    if fingerprint in seen or len(seen) >= CONFIG['max_pages']:
+        return False
+    seen.add(fingerprint)
+    if len(seen) == CONFIG['max_pages']:
+        logger.info(f"Reached max pages limit ({CONFIG['max_pages']})")
+    queue.put_nowait(norm_url)
+    return True
+
 async def fetch_sitemap_urls(base_url, session):
     """Fetch and parse sitemap.xml for URLs."""
     sitemap = base_url.rstrip('/') + '/sitemap.xml'
@@ -122,27 +145,17 @@ def url_to_filepath(url, base_domain, root_html):
     if not path or path == '/':
         return Path(root_html) / 'index.html'
     if not os.path.splitext(path)[1]:
-        folder = Path(root_html) / path
-        folder.mkdir(parents=True, exist_ok=True)
-        return folder / 'index.html'
-    folder = Path(root_html) / os.path.dirname(path)
-    folder.mkdir(parents=True, exist_ok=True)
-    return folder / os.path.basename(path)
+        return Path(root_html) / path / 'index.html'
+    return Path(root_html) / path
 
 def make_relative(from_path, to_path):
     """Create a relative path from one path to another."""
     rel = os.path.relpath(to_path, os.path.dirname(from_path))
     return rel.replace(os.sep, '/')
 
-async def process_page(url, base_domain, root_html, asset_dirs, session, visited, queue):
+async def process_page(norm_url, base_domain, root_html, asset_dirs, session, seen, queue):
     """Process a single page and its assets."""
-    norm_url = normalize_url(url)
-    if not norm_url or norm_url in visited or not is_valid_url(norm_url, base_domain):
-        return
-    if len(visited) >= CONFIG['max_pages']:
-        logger.info(f"Reached max pages limit ({CONFIG['max_pages']})")
-        return
-    visited.add(norm_url)
+    # norm_url was normalized, validated and deduplicated by enqueue_url
     logger.info(f"Fetching: {norm_url}")
 
     try:
@@ -182,12 +195,9 @@ async def process_page(url, base_domain, root_html, asset_dirs, session, visited
         if isinstance(result, Exception):
             logger.warning(f"Asset download failed: {result}")
 
-    # Enqueue internal links
-    for a in soup.find_all('a', href=True):
-        abs_link = urljoin(norm_url, a['href'])
-        child = normalize_url(abs_link)
-        if child and is_valid_url(child, base_domain) and child not in visited:
-            queue.append(child)
+    # Enqueue internal links, collapsing repeated hrefs (menus, footers) first
+    for href in {a['href'] for a in soup.find_all('a', href=True)}:
+        enqueue_url(urljoin(norm_url, href), base_domain, queue, seen)
 
     # Save modified HTML
     local_page.parent.mkdir(parents=True, exist_ok=True)
@@ -195,6 +205,73 @@ async def process_page(url, base_domain, root_html, asset_dirs, session, visited
         await f.write(soup.prettify())
     logger.info(f"Saved page: {local_page}")
 
+def make_connector():
+    """Build the keep-alive connection pool shared by every request of the crawl."""
+    return aiohttp.TCPConnector(
+        limit=CONFIG['pool_size'],
+        limit_per_host=CONFIG['pool_size_per_host'],
+        keepalive_timeout=CONFIG['keepalive_timeout'],
+        use_dns_cache=True,
+        ttl_dns_cache=CONFIG['dns_cache_ttl'],
+    )
+
+def connection_trace(stats):
+    """Return a TraceConfig that counts requests, new and reused connections and DNS lookups into stats."""
+    async def on_request_start(session, ctx, params):
+        stats['requests'] += 1
+        ctx.https = params.url.scheme == 'https'
+
+    async def on_connection_create_end(session, ctx, params):
+        stats['new_connections'] += 1
+        if getattr(ctx, 'https', False):
+            stats['tls_handshakes'] += 1
+
+    async def on_connection_reuseconn(session, ctx, params):
+        stats['reused_connections'] += 1
+
+    async def on_dns_cache_hit(session, ctx, params):
+        stats['dns_cache_hits'] += 1
+
+    async def on_dns_cache_miss(session, ctx, params):
+        stats['dns_cache_misses'] += 1
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace
+
+def log_connection_stats(stats):
+    """Log how well the connection pool was reused during the crawl."""
+    connections = stats['new_connections'] + stats['reused_connections']
+    reuse = stats['reused_connections'] / connections if connections else 0.0
+    logger.info(f"Connections: {stats['requests']} requests, {stats['new_connections']} opened "
+                f"({stats['tls_handshakes']} TLS handshakes), {stats['reused_connections']} reused ({reuse:.0%}), "
+                f"DNS cache {stats['dns_cache_hits']} hits / {stats['dns_cache_misses']} misses")
+
+async def run_workers(queue, handler, num_workers):
+    """Drain the work queue with a pool of long-lived workers until it is empty and idle."""
+    async def worker():
+        while True:
+            url = await queue.get()
+            try:
+                await handler(url)
+            except Exception as e:
+                logger.error(f"Worker failed on {url}: {e}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(num_workers)]
+    try:
+        # join() only returns once every queued URL, including links found mid-crawl, is done
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
 async def scrape_site(base_url=None, output_root=None):
     """Main crawling function."""
     base_url = base_url or CONFIG['base_url']
@@ -214,42 +291,34 @@ async def scrape_site(base_url=None, output_root=None):
         dir_path.mkdir(parents=True, exist_ok=True)
 
     # Initialize
-    visited = set()
-    queue = deque([normalize_url(base_url)])
+    seen = set()  # Fingerprints of every URL ever queued, including in-flight ones
+    queue = asyncio.Queue()
+    enqueue_url(base_url, base_domain, queue, seen)
     headers = {'User-Agent': CONFIG['user_agent']}
 
-    async with aiohttp.ClientSession(headers=headers) as session:
+    conn_stats = Counter()
+
+    async with aiohttp.ClientSession(headers=headers, connector=make_connector(), trace_configs=[connection_trace(conn_stats)]) as session:
         # Seed with sitemap
         if CONFIG['follow_sitemap']:
             sitemap_urls = await fetch_sitemap_urls(base_url, session)
             for url in sitemap_urls:
-                if url not in visited and is_valid_url(url, base_domain):
-                    queue.append(url)
+                enqueue_url(url, base_domain, queue, seen)
 
         # Fetch JSON endpoints for dynamic sites
         if CONFIG['fetch_json']:
             json_urls = await fetch_json_urls(base_url, session)
             for url in json_urls:
-                if url not in visited and is_valid_url(url, base_domain):
-                    queue.append(url)
+                enqueue_url(url, base_domain, queue, seen)
 
         # Process pages
-        semaphore = asyncio.Semaphore(CONFIG['max_concurrent'])
-        async def bounded_process(url):
-            async with semaphore:
-                await process_page(url, base_domain, root_html, asset_dirs, session, visited, queue)
-
-        tasks = []
-        while queue and len(visited) < CONFIG['max_pages']:
-            url = queue.popleft()
-            tasks.append(bounded_process(url))
-            if len(tasks) >= CONFIG['max_concurrent']:
-                await asyncio.gather(*tasks, return_exceptions=True)
-                tasks = []
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-    logger.info(f"Completed! Crawled {len(visited)} pages.")
+        async def handle(url):
+            await process_page(url, base_domain, root_html, asset_dirs, session, seen, queue)
+
+        await run_workers(queue, handle, CONFIG['max_concurrent'])
+
+    log_connection_stats(conn_stats)
+    logger.info(f"Completed! Crawled {len(seen)} pages.")
 
 async def main():
     base = sys.argv[1] if len(sys.argv) > 1 else CONFIG['base_url']
@@ -4,10 +4,11 @@ import sys
 import asyncio
 import aiohttp
 from urllib.parse import urljoin, urlparse, urlunparse, urldefrag, unquote
-from collections import deque
 import logging
 from pathlib import Path
 import re
+import hashlib
+from collections import Counter
 import certifi
 import ssl
 try:
@@ -26,6 +27,7 @@ CONFIG = {
     'timeout': 15,  # HTTP request timeout (seconds)
     'max_concurrent': 10,  # Concurrent downloads
     'max_retries': 3,  # Retry attempts for failed requests
+    'chunk_size': 64 * 1024,  # Bytes per read when streaming downloads to disk
     'asset_types': {'.css', '.js', '.jpg', '.jpeg', '.png', '.gif', '.woff', '.woff2', '.ttf', '.svg', '.php', '.ico'},
     'exclude_patterns': {r'.*wp-config\.php$', r'.*wp-login\.php$', r'.*\.sql$', r'.*\.zip$'},
     'user_agent': 'Mozilla/5.0 (compatible; WPCloner/1.1)',
@@ -34,6 +36,10 @@ CONFIG = {
     'wp_folders': {'wp-content', 'wp-admin', 'wp-includes'},
     'verify_ssl': True,  # Set to False to disable SSL verification (insecure)
     'ca_bundle': certifi.where(),  # Path to CA bundle
+    'pool_size': 100,  # Total pooled keep-alive connections
+    'pool_size_per_host': 32,  # Pooled connections per host
+    'keepalive_timeout': 30,  # Seconds an idle pooled connection is kept open
+    'dns_cache_ttl': 300,  # Seconds to cache DNS lookups
 }
 
 # Setup logging
@@ -65,6 +71,24 @@ def is_valid_url(url, base_domain):
     parsed = urlparse(url)
     return parsed.netloc.lower() == base_domain
 
+def url_fingerprint(url):
+    """Return a compact 64-bit fingerprint of a normalized URL."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def enqueue_url(url, base_domain, queue, seen):
+    """Queue a URL once, deduplicating on its fingerprint and enforcing max_pages."""
+    norm_url = normalize_url(url)
+    if not norm_url or not is_valid_url(norm_url, base_domain):
+        return False
+    fingerprint = url_fingerprint(norm_url)
+    if fingerprint in seen or len(seen) >= CONFIG['max_pages']:
+        return False
+    seen.add(fingerprint)
+    if len(seen) == CONFIG['max_pages']:
+        logger.info(f"Reached max pages limit ({CONFIG['max_pages']})")
+    queue.put_nowait(norm_url)
+    return True
+
 async def fetch_sitemap_urls(base_url, session):
     """Fetch and parse sitemap.xml for URLs."""
     sitemap = base_url.rstrip('/') + '/sitemap.xml'
@@ -99,30 +123,54 @@ async def fetch_json_urls(url, session):
             continue
     return json_urls
 
+def range_validator(resp):
+    """Return a validator usable in If-Range (a strong ETag or Last-Modified), if any."""
+    etag = resp.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return resp.headers.get('Last-Modified')
+
+async def stream_to_file(resp, part_path, offset=0):
+    """Stream a response body to part_path chunk by chunk, appending after offset."""
+    async with aiofiles.open(part_path, 'ab' if offset else 'wb') as f:
+        async for chunk in resp.content.iter_chunked(CONFIG['chunk_size']):
+            await f.write(chunk)
+
 async def save_resource(url, dest_path, session):
     """Download and save a resource asynchronously with retries."""
     if dest_path.exists():
         return dest_path.name
+    part_path = dest_path.with_name(dest_path.name + '.part')
+    validator = None  # If-Range validator of the response that wrote part_path
     for attempt in range(CONFIG['max_retries']):
+        offset = part_path.stat().st_size if validator and part_path.exists() else 0
+        headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
         try:
-            async with session.get(url, timeout=CONFIG['timeout']) as resp:
+            async with session.get(url, headers=headers, timeout=CONFIG['timeout']) as resp:
+                if resp.status == 416:
+                    validator = None  # Partial copy is unusable, restart from scratch
                 resp.raise_for_status()
                 content_type = resp.headers.get('Content-Type', '').lower()
+                dest_path.parent.mkdir(parents=True, exist_ok=True)
                 if 'text/html' in content_type:
-                    content = await resp.text()
-                    soup = BeautifulSoup(content, 'html.parser')
-                    content = soup.prettify()
+                    soup = BeautifulSoup(await resp.text(), 'html.parser')
+                    async with aiofiles.open(part_path, 'w', encoding='utf-8') as f:
+                        await f.write(soup.prettify())
                 else:
-                    content = await resp.read()
-                dest_path.parent.mkdir(parents=True, exist_ok=True)
-                async with aiofiles.open(dest_path, 'wb' if isinstance(content, bytes) else 'w', encoding=None if isinstance(content, bytes) else 'utf-8') as f:
-                    await f.write(content)
+                    # Anything but 206 means the server ignored Range and sent the whole body
+                    if resp.status != 206:
+                        offset = 0
+                    validator = range_validator(resp)
+                    await stream_to_file(resp, part_path, offset)
+                os.replace(part_path, dest_path)
                 logger.info(f"Saved resource: {url} → {dest_path}")
                 return dest_path.name
         except Exception as e:
             logger.warning(f"Attempt {attempt + 1}/{CONFIG['max_retries']} failed for {url}: {e}")
             if attempt + 1 < CONFIG['max_retries']:
                 await asyncio.sleep(1)  # Backoff before retry
+    if part_path.exists():
+        part_path.unlink()
     logger.error(f"Failed to download {url} after {CONFIG['max_retries']} attempts")
     return None
 
@@ -140,15 +188,9 @@ def url_to_filepath(url, base_domain, root_dir):
         return Path(root_dir) / path / 'index.html'
     return Path(root_dir) / path
 
-async def process_url(url, base_domain, root_dir, session, visited, queue):
+async def process_url(norm_url, base_domain, root_dir, session, seen, queue):
     """Process a single URL and its resources."""
-    norm_url = normalize_url(url)
-    if not norm_url or norm_url in visited or not is_valid_url(norm_url, base_domain):
-        return
-    if len(visited) >= CONFIG['max_pages']:
-        logger.info(f"Reached max pages limit ({CONFIG['max_pages']})")
-        return
-    visited.add(norm_url)
+    # norm_url was normalized, validated and deduplicated by enqueue_url
     logger.info(f"Fetching: {norm_url}")
 
     try:
@@ -181,11 +223,9 @@ async def process_url(url, base_domain, root_dir, session, visited, queue):
                         tasks.append(save_resource(abs_href, asset_path, session))
                         element[attr] = make_relative(local_path, asset_path)
         await asyncio.gather(*tasks, return_exceptions=True)
-        for a in soup.find_all('a', href=True):
-            abs_link = urljoin(norm_url, a['href'])
-            child = normalize_url(abs_link)
-            if child and is_valid_url(child, base_domain) and child not in visited:
-                queue.append(child)
+        # Collapse repeated hrefs (menus, footers) before normalizing them
+        for href in {a['href'] for a in soup.find_all('a', href=True)}:
+            enqueue_url(urljoin(norm_url, href), base_domain, queue, seen)
         local_path.parent.mkdir(parents=True, exist_ok=True)
         async with aiofiles.open(local_path, 'w', encoding='utf-8') as f:
             await f.write(soup.prettify())
@@ -198,6 +238,75 @@ def make_relative(from_path, to_path):
     rel = os.path.relpath(to_path, os.path.dirname(from_path))
     return rel.replace(os.sep, '/')
 
+def make_connector():
+    """Build the keep-alive connection pool shared by every request of the crawl."""
+    ssl_context = ssl.create_default_context(cafile=CONFIG['ca_bundle']) if CONFIG['verify_ssl'] else False
+    return aiohttp.TCPConnector(
+        ssl=ssl_context,
+        limit=CONFIG['pool_size'],
+        limit_per_host=CONFIG['pool_size_per_host'],
+        keepalive_timeout=CONFIG['keepalive_timeout'],
+        use_dns_cache=True,
+        ttl_dns_cache=CONFIG['dns_cache_ttl'],
+    )
+
+def connection_trace(stats):
+    """Return a TraceConfig that counts requests, new and reused connections and DNS lookups into stats."""
+    async def on_request_start(session, ctx, params):
+        stats['requests'] += 1
+        ctx.https = params.url.scheme == 'https'
+
+    async def on_connection_create_end(session, ctx, params):
+        stats['new_connections'] += 1
+        if getattr(ctx, 'https', False):
+            stats['tls_handshakes'] += 1
+
+    async def on_connection_reuseconn(session, ctx, params):
+        stats['reused_connections'] += 1
+
+    async def on_dns_cache_hit(session, ctx, params):
+        stats['dns_cache_hits'] += 1
+
+    async def on_dns_cache_miss(session, ctx, params):
+        stats['dns_cache_misses'] += 1
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace
+
+def log_connection_stats(stats):
+    """Log how well the connection pool was reused during the crawl."""
+    connections = stats['new_connections'] + stats['reused_connections']
+    reuse = stats['reused_connections'] / connections if connections else 0.0
+    logger.info(f"Connections: {stats['requests']} requests, {stats['new_connections']} opened "
+                f"({stats['tls_handshakes']} TLS handshakes), {stats['reused_connections']} reused ({reuse:.0%}), "
+                f"DNS cache {stats['dns_cache_hits']} hits / {stats['dns_cache_misses']} misses")
+
+async def run_workers(queue, handler, num_workers):
+    """Drain the work queue with a pool of long-lived workers until it is empty and idle."""
+    async def worker():
+        while True:
+            url = await queue.get()
+            try:
+                await handler(url)
+            except Exception as e:
+                logger.error(f"Worker failed on {url}: {e}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(num_workers)]
+    try:
+        # join() only returns once every queued URL, including links found mid-crawl, is done
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
 async def scrape_wp_site(base_url=None, output_root=None):
     """Main WordPress cloning function."""
     base_url = base_url or CONFIG['base_url']
@@ -205,24 +314,21 @@ async def scrape_wp_site(base_url=None, output_root=None):
     base_domain = urlparse(base_url).netloc.lower()
     root_dir = Path(output_root)
 
-    visited = set()
-    queue = deque([normalize_url(base_url)])
+    seen = set()  # Fingerprints of every URL ever queued, including in-flight ones
+    queue = asyncio.Queue()
+    enqueue_url(base_url, base_domain, queue, seen)
     headers = {'User-Agent': CONFIG['user_agent']}
+    conn_stats = Counter()
 
-    # Configure SSL context
-    ssl_context = None if not CONFIG['verify_ssl'] else ssl.create_default_context(cafile=CONFIG['ca_bundle'])
-
-    async with aiohttp.ClientSession(headers=headers, connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
+    async with aiohttp.ClientSession(headers=headers, connector=make_connector(), trace_configs=[connection_trace(conn_stats)]) as session:
         if CONFIG['follow_sitemap']:
             sitemap_urls = await fetch_sitemap_urls(base_url, session)
             for url in sitemap_urls:
-                if url not in visited and is_valid_url(url, base_domain):
-                    queue.append(url)
+                enqueue_url(url, base_domain, queue, seen)
         if CONFIG['fetch_json']:
             json_urls = await fetch_json_urls(base_url, session)
             for url in json_urls:
-                if url not in visited and is_valid_url(url, base_domain):
-                    queue.append(url)
+                enqueue_url(url, base_domain, queue, seen)
         wp_core_paths = [
             'wp-content/themes/',
             'wp-content/plugins/',
@@ -232,27 +338,15 @@ async def scrape_wp_site(base_url=None, output_root=None):
             'wp-blog-header.php',
         ]
         for path in wp_core_paths:
-            abs_url = urljoin(base_url, path)
-            norm_url = normalize_url(abs_url)
-            if norm_url and norm_url not in visited and is_valid_url(norm_url, base_domain):
-                queue.append(norm_url)
+            enqueue_url(urljoin(base_url, path), base_domain, queue, seen)
 
-        semaphore = asyncio.Semaphore(CONFIG['max_concurrent'])
-        async def bounded_process(url):
-            async with semaphore:
-                await process_url(url, base_domain, root_dir, session, visited, queue)
+        async def handle(url):
+            await process_url(url, base_domain, root_dir, session, seen, queue)
 
-        tasks = []
-        while queue and len(visited) < CONFIG['max_pages']:
-            url = queue.popleft()
-            tasks.append(bounded_process(url))
-            if len(tasks) >= CONFIG['max_concurrent']:
-                await asyncio.gather(*tasks, return_exceptions=True)
-                tasks = []
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-    logger.info(f"Completed! Crawled {len(visited)} resources.")
+        await run_workers(queue, handle, CONFIG['max_concurrent'])
+
+    log_connection_stats(conn_stats)
+    logger.info(f"Completed! Crawled {len(seen)} resources.")
 
 async def main():
     base = sys.argv[1] if len(sys.argv) > 1 else CONFIG['base_url']
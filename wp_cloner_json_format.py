@@ -3,38 +3,79 @@ import os
 import sys
 import asyncio
 import aiohttp
-from urllib.parse import urljoin, urlparse, urlunparse, urldefrag, unquote
-from collections import deque
+from aiohttp import web
+from urllib.parse import urljoin, urlparse, urlunparse, urldefrag, unquote, parse_qsl, urlencode
 import logging
 from pathlib import Path
 import re
+import hashlib
+import codecs
+from collections import Counter
 import certifi
 import ssl
 import json
 import argparse
 import datetime
+import html
+import sqlite3
+import random
+import time
+import contextlib
+import errno
+import shutil
+import fnmatch
+import zlib
+import functools
+import itertools
+import threading
+import bisect
+import heapq
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from xml.sax.saxutils import XMLGenerator
 try:
     from bs4 import BeautifulSoup
     import aiofiles
 except ImportError as e:
     print(f"Missing dependency: {e.name}. Install with `pip install requests beautifulsoup4 aiohttp aiofiles certifi`", file=sys.stderr)
     sys.exit(1)
+try:
+    import lxml  # noqa: F401  Optional, enables the 'lxml' parser backend
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
 
 # Configuration
 DEFAULT_CONFIG = {
     'base_url': 'https://www.hsc.co.ke/',
     'output_root': 'wp_clone',
     'max_pages': 10000,
-    'timeout': 15,
+    'class_quotas': {'asset': 0.25, 'api': 0.05, 'wp-core': 0.05},  # Max share of max_pages per URL class
+    'timeout': 15,  # Total seconds for login requests; crawl requests use the timeouts profiles below
+    # aiohttp.ClientTimeout limits (seconds) per request profile; sock_connect catches dead servers quickly
+    'timeouts': {
+        'page': {'connect': 10, 'sock_connect': 5, 'sock_read': 15, 'total': 30},
+        'asset': {'connect': 10, 'sock_connect': 5, 'sock_read': 15, 'total': None},  # Body budget scales with size
+        'api': {'connect': 10, 'sock_connect': 5, 'sock_read': 30, 'total': 60},
+    },
+    'body_timeout': 15,  # Seconds every streamed body gets before the size-scaled part of its budget
+    'min_throughput': 32 * 1024,  # Bytes/s floor; slower streamed bodies are aborted and retried (resuming)
     'max_concurrent': 10,
     'max_retries': 3,
     'asset_types': {'.css', '.js', '.jpg', '.jpeg', '.png', '.gif', '.woff', '.woff2', '.ttf', '.svg', '.php', '.ico'},
     'exclude_patterns': {r'.*wp-config\.php$', r'.*wp-config-sample\.php$', r'.*wp-login\.php$', r'.*\.sql$', r'.*\.zip$'},
+    # Query parameters are matched against these globs; kept ones are sorted into the canonical URL
+    'query_keep': {'p', 'page_id', 'paged', 'page', 'cat', 'tag', 'author', 'post_type', 's', 'lang', 'ver'},
+    'query_drop': {'utm_*', 'fbclid', 'gclid', 'mc_*', '_ga', 'replytocom', '_wpnonce', 'share', 'amp'},
+    'query_default': 'drop',  # What to do with parameters matching neither list ('keep' or 'drop')
     'user_agent': 'Mozilla/5.0 (compatible; WPCloner/1.3)',
     'follow_sitemap': True,
+    'sitemap_since': None,  # ISO date; skip sitemap URLs whose <lastmod> is older (incremental crawls)
     'fetch_json': True,
+    'rest_harvest': True,  # Export every REST collection to JSON Lines under output_root/rest_output
+    'rest_output': 'rest',
+    'rest_per_page': 100,  # Items per REST page (WordPress caps this at 100)
     'wp_folders': {'wp-content', 'wp-admin', 'wp-includes'},
     'verify_ssl': True,
     'ca_bundle': certifi.where(),
@@ -42,6 +83,38 @@ DEFAULT_CONFIG = {
     'password': '',
     'generate_xml': True,  # Generate WXR XML for WordPress import
     'xml_output': 'wordpress_export.xml',
+    'journal_file': 'crawl_journal.sqlite3',  # Crawl state under output_root, used by --resume
+    'conditional_get': True,  # Revalidate previously saved files with ETag/Last-Modified
+    'chunk_size': 64 * 1024,  # Bytes per read when streaming downloads to disk
+    'parse_workers': None,  # Processes for HTML parsing and rewriting (None = one per CPU)
+    'parser_backend': 'html.parser',  # 'html.parser', 'lxml' or 'fast' (attribute scanner, no tree)
+    'rewrite_mode': 'splice',  # 'splice' saves pages byte for byte with only asset links swapped; 'prettify' re-serializes the tree
+    'charset_sniff': 16 * 1024,  # Bytes of a page searched for <meta charset> and checked as UTF-8 when undeclared
+    'min_concurrent': 1,  # Floor for the adaptive per-host concurrency limit
+    'host_max_concurrent': 32,  # Ceiling for the adaptive per-host concurrency limit
+    'slow_latency_factor': 4,  # Back off when latency exceeds this multiple of the best seen
+    'max_rps': None,  # Optional per-host requests-per-second cap (token bucket)
+    'backoff_base': 0.5,  # Seconds; retry delays grow as base * 2**attempt with full jitter
+    'backoff_max': 30,  # Ceiling for a single retry delay, including Retry-After
+    # Deferred retries per error class: total attempts and base delay of the exponential backoff
+    'retry_policies': {
+        'timeout': {'attempts': 4, 'base': 1.0},
+        'connection': {'attempts': 4, 'base': 0.5},
+        'server': {'attempts': 3, 'base': 2.0},  # 5xx
+        'throttled': {'attempts': 5, 'base': 5.0},  # 429
+    },
+    'failure_report': 'failed_urls.json',  # URLs that still failed after their retries, under output_root
+    'pool_size': 100,  # Total pooled keep-alive connections
+    'keepalive_timeout': 30,  # Seconds an idle pooled connection is kept open
+    'dns_cache_ttl': 300,  # Seconds to cache DNS lookups
+    'writer_threads': 4,  # Threads in the file writer stage
+    'writer_queue': 256,  # Pending writes before producers wait for the writer stage
+    'fsync_writes': False,  # fsync written files (in batches) for crash-safe output
+    'fsync_batch': 64,  # Files per fsync batch
+    'metrics_file': 'crawl_metrics.json',  # JSON metrics summary written under output_root
+    'metrics_port': None,  # Serve Prometheus text metrics on this port during the crawl
+    'metrics_host': '127.0.0.1',
+    'blob_store': None,  # Content-addressed asset store shared by clones (None = output_root/.blobs, False = off)
 }
 
 # Setup logging
@@ -55,6 +128,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+revalidated_urls = set()  # Resources already checked against the origin during this run
+blob_store = None  # BlobStore for the current crawl, opened by scrape_wp_site
+file_writer = None  # FileWriter for the current crawl, started by scrape_wp_site
+retry_queue = None  # RetryQueue for the current crawl, run by run_workers
+asset_downloads = {}  # URL -> in-flight download task, shared by every page that references the asset
+saved_assets = {}  # URL -> filename of every asset saved or revalidated during this run
+
 def load_config(config_file='config.json'):
     """Load configuration from JSON file if exists."""
     config = DEFAULT_CONFIG.copy()
@@ -62,14 +142,42 @@ def load_config(config_file='config.json'):
         try:
             with open(config_file, 'r') as f:
                 file_config = json.load(f)
-            config.update(file_config)
+            for key, value in file_config.items():
+                default = config.get(key)
+                # Profile tables (timeouts, retry_policies) merge per profile, so one limit can be overridden alone
+                if isinstance(value, dict) and isinstance(default, dict) and default \
+                        and all(isinstance(v, dict) for v in default.values()):
+                    value = {**default, **{name: {**default.get(name, {}), **limits}
+                                           for name, limits in value.items()}}
+                config[key] = value
             logger.info(f"Loaded configuration from {config_file}")
         except Exception as e:
             logger.warning(f"Failed to load config file {config_file}: {e}")
     return config
 
-def normalize_url(url):
-    """Normalize URL by removing fragments and standardizing format."""
+@functools.lru_cache(maxsize=None)
+def compile_query_rules(keep, drop, default):
+    """Compile keep/drop parameter globs into one regex each."""
+    def union(patterns):
+        return re.compile('|'.join(fnmatch.translate(p) for p in patterns) or '(?!)')
+    return union(keep), union(drop), default == 'keep'
+
+def query_rules():
+    """Return the compiled query rules for the current CONFIG."""
+    return compile_query_rules(tuple(sorted(CONFIG['query_keep'])), tuple(sorted(CONFIG['query_drop'])),
+                               CONFIG['query_default'])
+
+def canonical_query(query, rules):
+    """Filter query parameters through the keep/drop rules and sort what is left."""
+    if not query:
+        return ''
+    keep, drop, keep_unknown = rules
+    params = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+              if keep.match(k) or (keep_unknown and not drop.match(k))]
+    return urlencode(sorted(params))
+
+def normalize_url(url, rules=None):
+    """Normalize URL by removing fragments, canonicalizing the query and standardizing format."""
     if not url:
         return None
     url, _ = urldefrag(url)
@@ -77,7 +185,8 @@ def normalize_url(url):
     if not parsed.scheme or not parsed.netloc:
         return None
     path = parsed.path or '/'
-    return urlunparse((parsed.scheme, parsed.netloc.lower(), path, '', '', ''))
+    query = canonical_query(parsed.query, rules or query_rules())
+    return urlunparse((parsed.scheme, parsed.netloc.lower(), path, '', query, ''))
 
 def is_valid_url(url, base_domain):
     """Check if URL is valid and belongs to the same domain."""
@@ -86,13 +195,567 @@ def is_valid_url(url, base_domain):
     parsed = urlparse(url)
     return parsed.netloc.lower() == base_domain
 
+@functools.lru_cache(maxsize=None)
+def compile_url_classifier(asset_types, exclude_patterns, wp_folders):
+    """Compile exclusions, asset types and WordPress folders into one alternation regex over URL paths."""
+    def alternation(patterns):
+        return '|'.join(patterns) or '(?!)'
+    return re.compile(
+        f"(?P<excluded>{alternation(f'(?:{pat})' for pat in exclude_patterns)})"
+        f"|(?P<asset>[^?#]*\\.(?i:{alternation(re.escape(ext.lstrip('.')) for ext in asset_types)})$)"
+        f"|(?P<wp_core>/?(?:{alternation(re.escape(folder) for folder in wp_folders)}))"
+    )
+
+def url_classifier():
+    """Return the compiled URL classifier for the current CONFIG."""
+    return compile_url_classifier(tuple(sorted(CONFIG['asset_types'])), tuple(sorted(CONFIG['exclude_patterns'])),
+                                  tuple(sorted(CONFIG['wp_folders'])))
+
+def classify_url(url, base_domain, classifier=None):
+    """Classify a URL as 'external', 'excluded', 'asset', 'wp-core' or 'page' with one regex match."""
+    parsed = urlparse(url)
+    if parsed.netloc.lower() != base_domain:
+        return 'external'
+    # Match on the path so enqueued assets like style.css?ver=6.5 are recognized
+    match = (classifier or url_classifier()).match(parsed.path)
+    if not match:
+        return 'page'
+    return 'wp-core' if match.lastgroup == 'wp_core' else match.lastgroup
+
+def url_fingerprint(url):
+    """Return a compact 64-bit fingerprint of a normalized URL."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+CLASS_RANK = {'page': 0, 'asset': 1, 'api': 2, 'wp-core': 3}
+SOURCE_RANK = {'seed': 0, 'sitemap': 1, 'rest': 1, 'link': 2}
+
+def frontier_class(norm_url, base_domain):
+    """Content class of a same-site URL for the frontier: page, asset, api, wp-core or excluded."""
+    if urlparse(norm_url).path.startswith('/wp-json/'):
+        return 'api'
+    return classify_url(norm_url, base_domain)
+
+class Frontier(asyncio.PriorityQueue):
+    """Priority crawl frontier with a max_pages budget and per-class quotas.
+
+    URLs come out ordered by content class (pages first), depth, source
+    (seeds, then sitemap and REST, then discovered links) and newest sitemap
+    <lastmod>. Workers receive (url, url_class, depth). The budget is charged
+    by take() when a URL is dispatched rather than when it is discovered, so
+    a limited crawl spends max_pages on the most useful URLs it has found.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.counter = itertools.count()  # FIFO tie-breaker among equal priorities
+        self.taken = Counter()
+        self.skipped = 0
+
+    def push(self, url, url_class, depth=0, source='link', lastmod=None):
+        """Queue a URL at the priority given by its class, depth, source and lastmod."""
+        priority = (CLASS_RANK[url_class], depth, SOURCE_RANK[source], -lastmod.timestamp() if lastmod else 0)
+        self.put_nowait((priority, next(self.counter), url, url_class, depth))
+
+    def _get(self):
+        # Strip the priority and tie-breaker before the entry reaches a worker
+        return super()._get()[2:]
+
+    def take(self, url_class):
+        """Charge a dispatched URL to max_pages and its class quota; False means skip it."""
+        total = sum(self.taken.values())
+        quota = CONFIG['class_quotas'].get(url_class)
+        if total >= CONFIG['max_pages'] or (quota is not None and self.taken[url_class] >= quota * CONFIG['max_pages']):
+            if not self.skipped:
+                logger.info(f"Reached max pages limit ({CONFIG['max_pages']}) or the quota for {url_class} URLs")
+            self.skipped += 1
+            return False
+        self.taken[url_class] += 1
+        return True
+
+def enqueue_url(url, base_domain, queue, seen, journal=None, rules=None, depth=0, source='link', lastmod=None):
+    """Queue a URL once, deduplicating on its fingerprint and skipping excluded URLs."""
+    norm_url = normalize_url(url, rules)
+    if not norm_url or not is_valid_url(norm_url, base_domain):
+        return False
+    url_class = frontier_class(norm_url, base_domain)
+    if url_class == 'excluded':
+        return False
+    fingerprint = url_fingerprint(norm_url)
+    if fingerprint in seen:
+        return False
+    seen.add(fingerprint)
+    if journal is not None:
+        journal.execute("INSERT OR IGNORE INTO urls (url, status) VALUES (?, 'queued')", (norm_url,))
+    queue.push(norm_url, url_class, depth, source, lastmod)
+    return True
+
+def enqueue_urls(urls, base_domain, queue, seen, journal=None, depth=0, source='link'):
+    """Queue a batch of URLs, compiling the query rules once for all of them."""
+    rules = query_rules()
+    for url in urls:
+        enqueue_url(url, base_domain, queue, seen, journal, rules, depth, source)
+
+def open_journal(root_dir, resume=False):
+    """Open the SQLite crawl journal under output_root, starting fresh unless resuming."""
+    root_dir.mkdir(parents=True, exist_ok=True)
+    journal = sqlite3.connect(root_dir / CONFIG['journal_file'])
+    journal.execute('PRAGMA journal_mode=WAL')
+    journal.execute('PRAGMA synchronous=NORMAL')
+    if not resume:
+        journal.execute('DROP TABLE IF EXISTS urls')
+        journal.execute('DROP TABLE IF EXISTS pages')
+    journal.execute('CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, status TEXT NOT NULL, error TEXT)')
+    journal.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, title TEXT, content TEXT, slug TEXT)')
+    # Validators survive fresh runs so nightly re-crawls can revalidate instead of re-downloading
+    journal.execute('CREATE TABLE IF NOT EXISTS validators (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+                    'content_type TEXT, content_length INTEGER, sha256 TEXT)')
+    # Each page's record, links and asset URLs from its last full fetch, reused when a later run gets a 304 for it
+    journal.execute('CREATE TABLE IF NOT EXISTS page_records (url TEXT PRIMARY KEY, title TEXT, content TEXT, slug TEXT)')
+    journal.execute('CREATE TABLE IF NOT EXISTS page_links (url TEXT PRIMARY KEY, links TEXT, assets TEXT)')
+    journal.commit()
+    return journal
+
+def load_journal(journal, queue, seen, base_domain, wxr=None):
+    """Restore seen URLs, the pending frontier and collected pages from a previous run."""
+    # URLs skipped over budget get another chance, possibly with a larger max_pages
+    journal.execute("UPDATE urls SET status = 'queued' WHERE status = 'skipped'")
+    # A page record can be committed before its URL is marked done; that URL is crawled again and re-recorded
+    journal.execute("DELETE FROM pages WHERE url IN (SELECT url FROM urls WHERE status = 'queued')")
+    pending = 0
+    for url, status in journal.execute('SELECT url, status FROM urls'):
+        seen.add(url_fingerprint(url))
+        # URLs still 'queued' were either waiting or in flight when the run stopped
+        if status == 'queued':
+            queue.push(url, frontier_class(url, base_domain))
+            pending += 1
+        else:
+            # Work finished in earlier runs still counts against max_pages and the class quotas
+            queue.taken[frontier_class(url, base_domain)] += 1
+    collected = 0
+    for page in iter_pages(journal):
+        collected += 1
+        if wxr:
+            wxr.write_item(page)
+    logger.info(f"Resuming crawl: {len(seen)} known URLs, {pending} pending, {collected} pages collected")
+
+def record_url(journal, url, status, error=None):
+    """Record the outcome of a crawled URL in the journal."""
+    journal.execute('UPDATE urls SET status = ?, error = ? WHERE url = ?', (status, error, url))
+
+def record_page(journal, page):
+    """Store the extracted page record so exports can be rebuilt without the crawl."""
+    for table in ('pages', 'page_records'):
+        journal.execute(f'INSERT OR REPLACE INTO {table} (url, title, content, slug) VALUES (?, ?, ?, ?)',
+                        (page['url'], page['title'], page['content'], page['slug']))
+
+def record_page_links(journal, url, links, asset_urls):
+    """Store the links and original asset URLs of a page parsed from a full fetch."""
+    journal.execute('INSERT OR REPLACE INTO page_links (url, links, assets) VALUES (?, ?, ?)',
+                    (url, json.dumps(links), json.dumps(asset_urls)))
+
+def stored_page_links(journal, url):
+    """Return (links, asset_urls) stored at a page's last full fetch, in any run, or None."""
+    row = journal.execute('SELECT links, assets FROM page_links WHERE url = ?', (url,)).fetchone()
+    return (json.loads(row[0]), json.loads(row[1])) if row else None
+
+def stored_page_record(journal, url):
+    """Return the record extracted at a page's last full fetch, in any run, or None."""
+    row = journal.execute('SELECT title, content, slug FROM page_records WHERE url = ?', (url,)).fetchone()
+    return {'title': row[0], 'content': row[1], 'slug': row[2], 'url': url} if row else None
+
+def iter_pages(journal):
+    """Stream page records back from the journal in the order they were crawled."""
+    for url, title, content, slug in journal.execute('SELECT url, title, content, slug FROM pages ORDER BY rowid'):
+        yield {'title': title, 'content': content, 'slug': slug, 'url': url}
+
+def conditional_headers(journal, url, local_path):
+    """Build If-None-Match/If-Modified-Since headers for a URL we already have a local copy of."""
+    if not CONFIG['conditional_get'] or not local_path.exists():
+        return {}
+    row = journal.execute('SELECT etag, last_modified FROM validators WHERE url = ?', (url,)).fetchone()
+    headers = {}
+    if row and row[0]:
+        headers['If-None-Match'] = row[0]
+    if row and row[1]:
+        headers['If-Modified-Since'] = row[1]
+    return headers
+
+def stored_content_type(journal, url):
+    """Return the Content-Type recorded for a URL, used when a 304 response omits it."""
+    row = journal.execute('SELECT content_type FROM validators WHERE url = ?', (url,)).fetchone()
+    return row[0] if row and row[0] else ''
+
+def store_validators(journal, url, resp, digest, length):
+    """Record validators for a fetched body; return True if it differs from the previous copy."""
+    row = journal.execute('SELECT sha256 FROM validators WHERE url = ?', (url,)).fetchone()
+    journal.execute('INSERT OR REPLACE INTO validators (url, etag, last_modified, content_type, content_length, sha256) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                     resp.headers.get('Content-Type', '').lower(), length, digest))
+    return row is None or row[0] != digest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class CrawlMetrics:
+    """Counters, peak gauges and timing histograms for one crawl.
+
+    Every timer keeps a count, a total and Prometheus-style latency buckets,
+    labelled by content type or stage. summary() gives the JSON view and
+    prometheus() the text exposition format.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = Counter()  # (name, label) -> value
+        self.timers = {}  # (name, label) -> [count, total seconds, bucket counts]
+        self.peaks = {}
+
+    def inc(self, name, value=1, label=''):
+        self.counters[name, label] += value
+
+    def observe(self, name, seconds, label=''):
+        """Record one duration in a timer and its histogram."""
+        timer = self.timers.get((name, label))
+        if timer is None:
+            timer = self.timers[name, label] = [0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)]
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def peak(self, name, value):
+        self.peaks[name] = max(self.peaks.get(name, 0), value)
+
+    @contextlib.contextmanager
+    def timer(self, name, label=''):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, label)
+
+    def summary(self):
+        """Return the metrics as a JSON-serializable dict with derived rates."""
+        elapsed = time.monotonic() - self.started
+        counters = {}
+        for (name, label), value in sorted(self.counters.items()):
+            counters.setdefault(name, {})[label or 'total'] = value
+        timings = {}
+        for (name, label), (count, total, buckets) in sorted(self.timers.items()):
+            cumulative = list(itertools.accumulate(buckets))
+            timings.setdefault(name, {})[label or 'total'] = {
+                'count': count,
+                'total_seconds': round(total, 6),
+                'mean_seconds': round(total / count, 6) if count else 0,
+                'buckets': {str(le): n for le, n in zip(LATENCY_BUCKETS + ('+Inf',), cumulative)},
+            }
+        requests = sum(counters.get('requests', {}).values())
+        received = sum(counters.get('bytes_received', {}).values())
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'requests_per_second': round(requests / elapsed, 2) if elapsed else 0,
+            'bytes_per_second': round(received / elapsed, 1) if elapsed else 0,
+            'counters': counters,
+            'timings': timings,
+            'peaks': self.peaks,
+        }
+
+    def prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        def labels(label, **extra):
+            pairs = ([('kind', label)] if label else []) + list(extra.items())
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+        lines = []
+        for (name, label), value in sorted(self.counters.items()):
+            lines.append(f"wpcloner_{name}_total{labels(label)} {value}")
+        for (name, label), (count, total, buckets) in sorted(self.timers.items()):
+            for le, n in zip(LATENCY_BUCKETS + ('+Inf',), itertools.accumulate(buckets)):
+                lines.append(f"wpcloner_{name}_seconds_bucket{labels(label, le=le)} {n}")
+            lines.append(f"wpcloner_{name}_seconds_sum{labels(label)} {total}")
+            lines.append(f"wpcloner_{name}_seconds_count{labels(label)} {count}")
+        for name, value in sorted(self.peaks.items()):
+            lines.append(f"wpcloner_{name}_peak {value}")
+        lines.append(f"wpcloner_elapsed_seconds {time.monotonic() - self.started}")
+        return '\n'.join(lines) + '\n'
+
+metrics = CrawlMetrics()  # Metrics of the current crawl, replaced by scrape_wp_site
+
+def metrics_trace():
+    """Return a TraceConfig timing DNS, connect (TCP plus TLS) and time to first byte, and counting bytes."""
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def on_dns_resolvehost_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def on_dns_resolvehost_end(session, ctx, params):
+        metrics.observe('http_dns', time.perf_counter() - ctx.dns_start)
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_connection_create_end(session, ctx, params):
+        metrics.observe('http_connect', time.perf_counter() - ctx.connect_start)
+
+    async def on_request_end(session, ctx, params):
+        metrics.observe('http_ttfb', time.perf_counter() - ctx.start)
+
+    async def on_response_chunk_received(session, ctx, params):
+        metrics.inc('bytes_received', len(params.chunk))
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    trace.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    trace.on_connection_create_start.append(on_connection_create_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_request_end.append(on_request_end)
+    trace.on_response_chunk_received.append(on_response_chunk_received)
+    return trace
+
+async def start_metrics_server(port):
+    """Serve the live metrics in Prometheus text format at /metrics; returns the runner to clean up."""
+    async def handle_metrics(request):
+        return web.Response(text=metrics.prometheus(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, CONFIG['metrics_host'], port).start()
+    logger.info(f"Serving metrics on http://{CONFIG['metrics_host']}:{port}/metrics")
+    return runner
+
+class HostLimiter:
+    """Adaptive concurrency limit and pacing for requests to one host.
+
+    The limit follows AIMD: it grows by roughly one slot per window of
+    successful requests and is halved on timeouts, connection errors, 5xx,
+    429 or latency far above the best observed. A Retry-After on 429/503
+    pauses every request to the host, and max_rps adds a token bucket.
+    """
+
+    def __init__(self):
+        self.limit = float(CONFIG['max_concurrent'])
+        self.active = 0
+        self.cond = asyncio.Condition()
+        self.best_latency = None
+        self.last_decrease = 0.0
+        self.blocked_until = 0.0
+        self.tokens = float(CONFIG['max_rps'] or 0)
+        self.refilled = time.monotonic()
+
+    async def acquire(self):
+        """Wait for a free slot, then for any Retry-After pause or rate-limit token."""
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        now = time.monotonic()
+        delay = max(0.0, self.blocked_until - now)
+        if CONFIG['max_rps']:
+            rate = CONFIG['max_rps']
+            self.tokens = min(max(1.0, rate), self.tokens + (now - self.refilled) * rate)
+            self.refilled = now
+            self.tokens -= 1
+            if self.tokens < 0:
+                delay = max(delay, -self.tokens / rate)
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                # fetch() only releases slots it acquired, so give this one back here
+                await self.release()
+                raise
+
+    async def release(self):
+        """Free a slot and wake as many waiters as the current limit allows."""
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify(max(1, int(self.limit) - self.active))
+
+    def on_success(self, latency):
+        """Additive increase, unless latency says the origin is struggling."""
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+        if latency > self.best_latency * CONFIG['slow_latency_factor'] and latency > 1.0:
+            self.on_congestion(latency)
+        else:
+            self.limit = min(CONFIG['host_max_concurrent'], self.limit + 1 / self.limit)
+
+    def on_congestion(self, latency=1.0, retry_after=None):
+        """Multiplicative decrease, at most once per round trip; honor Retry-After."""
+        now = time.monotonic()
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + min(retry_after, CONFIG['backoff_max']))
+        if now - self.last_decrease > max(latency, 0.5):
+            self.limit = max(CONFIG['min_concurrent'], self.limit / 2)
+            self.last_decrease = now
+            logger.info(f"Reducing concurrency limit to {int(self.limit)}")
+
+host_limiters = {}  # netloc -> HostLimiter
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def retry_class(error):
+    """Retry policy name for an error: timeout, connection, server or throttled; None if retrying is futile."""
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(error, aiohttp.ClientResponseError):
+        if error.status == 429:
+            return 'throttled'
+        return 'server' if error.status >= 500 else None
+    if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, ConnectionError)):
+        return 'connection'
+    return None
+
+def retry_delay(attempt, error=None):
+    """Exponential backoff with full jitter from the error's policy, or the server's Retry-After on 429/503."""
+    metrics.inc('retries', label=type(error).__name__ if error else '')
+    if isinstance(error, aiohttp.ClientResponseError) and error.status in (429, 503) and error.headers:
+        retry_after = parse_retry_after(error.headers.get('Retry-After'))
+        if retry_after is not None:
+            return min(retry_after, CONFIG['backoff_max'])
+    policy = CONFIG['retry_policies'].get(retry_class(error)) or {}
+    base = policy.get('base', CONFIG['backoff_base'])
+    return random.uniform(0, min(CONFIG['backoff_max'], base * 2 ** attempt))
+
+class RetryQueue:
+    """Time-ordered queue of failed requests waiting for another attempt.
+
+    Rather than sleeping in the worker (and page) that hit the error, callers
+    schedule() a retry callable and move on. The error class picks a policy
+    from retry_policies, run() fires each retry once its backoff has elapsed,
+    and coroutines it returns are tracked until they finish. Errors that are
+    not worth retrying, or that exhaust their policy, are kept in failures
+    for the end-of-crawl report.
+    """
+
+    def __init__(self):
+        self.heap = []  # (due, seq, url, retry)
+        self.counter = itertools.count()
+        self.scheduled = set()  # URLs waiting in the heap
+        self.tasks = set()  # Retries currently running
+        self.attempts = Counter()  # url -> retries scheduled so far
+        self.failures = {}  # url -> error details once it is given up on
+        self.wakeup = asyncio.Event()  # Set when an entry is added
+        self.changed = asyncio.Event()  # Set when an entry fires or a retry finishes
+
+    def __contains__(self, url):
+        return url in self.scheduled
+
+    def __len__(self):
+        return len(self.heap) + len(self.tasks)
+
+    def schedule(self, url, error, retry):
+        """Queue retry() for a failed URL after its policy's backoff; False (and recorded) once it is given up on."""
+        error_class = retry_class(error)
+        policy = CONFIG['retry_policies'].get(error_class)
+        attempt = self.attempts[url]
+        message = str(error) or type(error).__name__  # Timeouts carry no message
+        if policy is None or attempt + 1 >= policy['attempts']:
+            self.failures[url] = {'error_class': error_class or type(error).__name__,
+                                  'attempts': attempt + 1, 'error': message}
+            return False
+        self.attempts[url] += 1
+        delay = retry_delay(attempt, error)
+        heapq.heappush(self.heap, (time.monotonic() + delay, next(self.counter), url, retry))
+        self.scheduled.add(url)
+        self.wakeup.set()
+        logger.warning(f"Retrying {url} in {delay:.1f}s ({error_class}, attempt {attempt + 2}/{policy['attempts']}): {message}")
+        return True
+
+    async def run(self):
+        """Fire retries as they fall due; runs until cancelled."""
+        while True:
+            delay = self.heap[0][0] - time.monotonic() if self.heap else None
+            if delay is None or delay > 0:
+                self.wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                continue
+            _, _, url, retry = heapq.heappop(self.heap)
+            self.scheduled.discard(url)
+            outcome = retry()
+            if asyncio.iscoroutine(outcome):
+                task = asyncio.create_task(outcome)
+                self.tasks.add(task)
+                task.add_done_callback(self.finished)
+            self.changed.set()
+
+    def finished(self, task):
+        self.tasks.discard(task)
+        self.changed.set()
+
+    async def drain(self):
+        """Wait until no retry is scheduled or running."""
+        while len(self):
+            self.changed.clear()
+            await self.changed.wait()
+
+    def report(self, path):
+        """Write the URLs that still failed to path as JSON and log a summary of them."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.failures, f, indent=2)
+        recovered = sum(1 for url in self.attempts if url not in self.failures)
+        by_class = Counter(failure['error_class'] for failure in self.failures.values())
+        summary = ', '.join(f"{n} {error_class}" for error_class, n in by_class.most_common())
+        logger.info(f"Retries: {recovered} URLs recovered after a deferred retry, {len(self.failures)} still failed"
+                    f"{f' ({summary})' if summary else ''} → {path}")
+        for url, failure in itertools.islice(self.failures.items(), 20):
+            logger.info(f"  {url}: {failure['error']} after {failure['attempts']} attempt(s)")
+
+@contextlib.asynccontextmanager
+async def fetch(session, url, **kwargs):
+    """GET a URL through its host's limiter, feeding latency and errors back into it and into metrics."""
+    netloc = urlparse(url).netloc
+    limiter = host_limiters.get(netloc)
+    if limiter is None:
+        limiter = host_limiters[netloc] = HostLimiter()
+    with metrics.timer('limiter_wait'):
+        await limiter.acquire()
+    metrics.inc('requests')
+    start = time.monotonic()
+    try:
+        async with session.get(url, **kwargs) as resp:
+            latency = time.monotonic() - start
+            metrics.inc('responses', label=str(resp.status))
+            if resp.status == 429 or resp.status >= 500:
+                limiter.on_congestion(latency, parse_retry_after(resp.headers.get('Retry-After')))
+            else:
+                limiter.on_success(latency)
+            yield resp
+            # The caller has consumed the body by now
+            elapsed = time.monotonic() - start
+            metrics.observe('http_body', elapsed - latency)
+            metrics.observe('http_request', elapsed, resp.content_type)
+    except (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError) as e:
+        limiter.on_congestion(time.monotonic() - start)
+        metrics.inc('errors', label=type(e).__name__)
+        raise
+    except Exception as e:
+        metrics.inc('errors', label=type(e).__name__)
+        raise
+    finally:
+        await limiter.release()
+
 async def login(session, base_url, username, password):
     """Attempt to log in to WordPress via wp-login.php."""
     login_url = urljoin(base_url, 'wp-login.php')
     try:
         async with session.get(login_url, timeout=CONFIG['timeout']) as resp:
             resp.raise_for_status()
-            soup = BeautifulSoup(await resp.text(), 'html.parser')
+            body = await resp.read()
+            soup = BeautifulSoup(body, 'html.parser', from_encoding=sniff_charset(body, resp.charset))
             login_form = soup.find('form', id='loginform')
             if not login_form:
                 logger.warning("Could not find login form on wp-login.php")
@@ -117,23 +780,106 @@ async def login(session, base_url, username, password):
         logger.error(f"Login error: {e}")
         return False
 
-async def fetch_sitemap_urls(base_url, session):
-    """Fetch and parse sitemap.xml for URLs."""
-    sitemap = base_url.rstrip('/') + '/sitemap.xml'
+SITEMAP_CANDIDATES = ['wp-sitemap.xml', 'sitemap_index.xml', 'sitemap.xml']
+OLDEST = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+
+def parse_lastmod(value):
+    """Parse a sitemap <lastmod> (W3C datetime) into an aware datetime, or None."""
+    try:
+        parsed = datetime.datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+async def sitemaps_from_robots(base_url, session):
+    """Return the sitemaps advertised by Sitemap: lines in robots.txt."""
+    robots = urljoin(base_url, '/robots.txt')
+    try:
+        async with fetch(session, robots, timeout=client_timeout('api')) as resp:
+            if resp.status != 200:
+                return []
+            text = await resp.text(errors='replace')
+    except Exception as e:
+        logger.warning(f"Failed to fetch {robots}: {e}")
+        return []
+    return [line.split(':', 1)[1].strip() for line in text.splitlines() if line.lower().startswith('sitemap:')]
+
+def collect_sitemap_entries(events, children, entries):
+    """Sort finished <sitemap> and <url> elements into child sitemaps and (url, lastmod) entries."""
+    for _, elem in events:
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if tag not in ('sitemap', 'url'):
+            continue
+        loc = elem.findtext('{*}loc')
+        if loc:
+            if tag == 'sitemap':
+                children.append(loc.strip())
+            else:
+                entries.append((loc.strip(), parse_lastmod(elem.findtext('{*}lastmod'))))
+        # Drop the parsed subtree so large sitemaps never accumulate in memory
+        elem.clear()
+
+async def parse_sitemap(session, url):
+    """Stream one sitemap or sitemap index, gzipped or not, through an incremental parser.
+
+    Returns (child_sitemaps, entries) where entries are (url, lastmod) pairs.
+    """
     for attempt in range(CONFIG['max_retries']):
+        children, entries = [], []
+        parser = ET.XMLPullParser(events=('end',))
         try:
-            async with session.get(sitemap, timeout=CONFIG['timeout']) as resp:
+            async with fetch(session, url, timeout=client_timeout('api')) as resp:
+                if resp.status == 404:
+                    logger.info(f"No sitemap at {url}")
+                    return [], []
                 resp.raise_for_status()
-                root = ET.fromstring(await resp.text())
-                urls = [normalize_url(loc.text.strip()) for loc in root.findall('.//{*}loc') if loc.text]
-                logger.info(f"Found {len(urls)} URLs in sitemap.xml")
-                return [url for url in urls if url]
+                inflate = None
+                async for chunk in resp.content.iter_chunked(CONFIG['chunk_size']):
+                    if inflate is None:
+                        # .xml.gz files arrive still compressed unless the server set Content-Encoding
+                        inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b'\x1f\x8b' else False
+                    parser.feed(inflate.decompress(chunk) if inflate else chunk)
+                    collect_sitemap_entries(parser.read_events(), children, entries)
+                parser.close()
+                collect_sitemap_entries(parser.read_events(), children, entries)
+            logger.info(f"Found {len(entries)} URLs and {len(children)} sitemaps in {url}")
+            return children, entries
         except Exception as e:
-            logger.warning(f"Attempt {attempt + 1}/{CONFIG['max_retries']} failed for sitemap {sitemap}: {e}")
+            logger.warning(f"Attempt {attempt + 1}/{CONFIG['max_retries']} failed for sitemap {url}: {e}")
             if attempt + 1 < CONFIG['max_retries']:
-                await asyncio.sleep(1)
-    logger.error(f"Failed to fetch sitemap {sitemap} after {CONFIG['max_retries']} attempts")
-    return []
+                await asyncio.sleep(retry_delay(attempt, e))
+    logger.error(f"Failed to fetch sitemap {url} after {CONFIG['max_retries']} attempts")
+    return [], []
+
+async def fetch_sitemap_urls(base_url, session):
+    """Collect (url, lastmod) entries from robots.txt sitemaps or the usual WordPress locations, newest first.
+
+    Sitemap indexes are expanded level by level with the child sitemaps of
+    each level fetched concurrently. URLs whose <lastmod> predates
+    sitemap_since are skipped.
+    """
+    sitemaps = await sitemaps_from_robots(base_url, session)
+    if not sitemaps:
+        sitemaps = [urljoin(base_url, name) for name in SITEMAP_CANDIDATES]
+    fetched = set()
+    entries = []
+    while sitemaps:
+        batch = [sitemap for sitemap in dict.fromkeys(sitemaps) if sitemap not in fetched]
+        fetched.update(batch)
+        results = await asyncio.gather(*(parse_sitemap(session, sitemap) for sitemap in batch))
+        sitemaps = [child for children, _ in results for child in children]
+        for _, found in results:
+            entries.extend(found)
+
+    since = parse_lastmod(CONFIG['sitemap_since']) if CONFIG['sitemap_since'] else None
+    if since:
+        fresh = [(url, lastmod) for url, lastmod in entries if lastmod is None or lastmod >= since]
+        logger.info(f"Skipping {len(entries) - len(fresh)} sitemap URLs unchanged since {CONFIG['sitemap_since']}")
+        entries = fresh
+    # Recently modified pages first; URLs without <lastmod> last
+    entries.sort(key=lambda entry: entry[1] or OLDEST, reverse=True)
+    logger.info(f"Found {len(entries)} URLs in {len(fetched)} sitemaps")
+    return entries
 
 async def fetch_json_urls(url, session):
     """Fetch WordPress REST API endpoints."""
@@ -148,7 +894,7 @@ async def fetch_json_urls(url, session):
     for endpoint in possible_endpoints:
         for attempt in range(CONFIG['max_retries']):
             try:
-                async with session.get(endpoint, timeout=CONFIG['timeout']) as resp:
+                async with fetch(session, endpoint, timeout=client_timeout('api')) as resp:
                     if resp.status == 200 and 'application/json' in resp.headers.get('Content-Type', ''):
                         json_urls.append(endpoint)
                         logger.info(f"Found JSON endpoint: {endpoint}")
@@ -156,66 +902,575 @@ async def fetch_json_urls(url, session):
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1}/{CONFIG['max_retries']} failed for {endpoint}: {e}")
                 if attempt + 1 < CONFIG['max_retries']:
-                    await asyncio.sleep(1)
+                    await asyncio.sleep(retry_delay(attempt, e))
     return json_urls
 
-async def save_resource(url, dest_path, session):
-    """Download and save a resource asynchronously with retries."""
-    if dest_path.exists():
-        return dest_path.name
+REST_FALLBACK_ROUTES = ['wp/v2/posts', 'wp/v2/pages', 'wp/v2/media', 'wp/v2/categories', 'wp/v2/tags', 'wp/v2/users']
+
+async def fetch_rest_json(session, url, params=None):
+    """GET a REST endpoint with retries; return (data, total_pages), or (None, 0) if it is unavailable."""
     for attempt in range(CONFIG['max_retries']):
         try:
-            async with session.get(url, timeout=CONFIG['timeout']) as resp:
+            async with fetch(session, url, params=params, timeout=client_timeout('api')) as resp:
+                if resp.status in (400, 401, 403, 404):
+                    # Missing route, private collection or a page past the end: retrying will not help
+                    logger.info(f"REST endpoint unavailable ({resp.status}): {resp.url}")
+                    return None, 0
                 resp.raise_for_status()
-                content_type = resp.headers.get('Content-Type', '').lower()
-                if 'text/html' in content_type:
-                    content = await resp.text()
-                    soup = BeautifulSoup(content, 'html.parser')
-                    content = soup.prettify()
-                else:
-                    content = await resp.read()
-                dest_path.parent.mkdir(parents=True, exist_ok=True)
-                async with aiofiles.open(dest_path, 'wb' if isinstance(content, bytes) else 'w', encoding=None if isinstance(content, bytes) else 'utf-8') as f:
-                    await f.write(content)
-                logger.info(f"Saved resource: {url} → {dest_path}")
-                return dest_path.name
+                # JSON is UTF-8 (RFC 8259); naming it skips charset detection when the header omits it
+                data = await resp.json(content_type=None, encoding='utf-8')
+                return data, int(resp.headers.get('X-WP-TotalPages', 1))
         except Exception as e:
             logger.warning(f"Attempt {attempt + 1}/{CONFIG['max_retries']} failed for {url}: {e}")
             if attempt + 1 < CONFIG['max_retries']:
-                await asyncio.sleep(1)
-    logger.error(f"Failed to download {url} after {CONFIG['max_retries']} attempts")
-    return None
+                await asyncio.sleep(retry_delay(attempt, e))
+    logger.error(f"Failed to fetch {url} after {CONFIG['max_retries']} attempts")
+    return None, 0
+
+async def discover_rest_routes(session, api_root):
+    """List collection routes for every post type and taxonomy the site exposes, plus users."""
+    routes = []
+    for index in ('types', 'taxonomies'):
+        data, _ = await fetch_rest_json(session, f"{api_root}wp/v2/{index}")
+        if not isinstance(data, dict):
+            continue
+        for info in data.values():
+            if isinstance(info, dict) and info.get('rest_base'):
+                routes.append(f"{info.get('rest_namespace') or 'wp/v2'}/{info['rest_base']}")
+    if not routes:
+        return REST_FALLBACK_ROUTES
+    return list(dict.fromkeys(routes + ['wp/v2/users']))
+
+async def harvest_rest_collection(session, api_root, route, out_dir):
+    """Fetch every page of one REST collection concurrently and stream its items to a JSON Lines file."""
+    url = f"{api_root}{route}"
+    params = {'per_page': CONFIG['rest_per_page']}
+    first, total_pages = await fetch_rest_json(session, url, {**params, 'page': 1})
+    if not isinstance(first, list):
+        return []
+    out_path = out_dir / (route.replace('/', '_') + '.jsonl')
+    links = []
+    count = 0
+
+    async with aiofiles.open(out_path, 'w', encoding='utf-8') as f:
+        async def write_page(items):
+            nonlocal count
+            if not isinstance(items, list) or not items:
+                return
+            links.extend(item['link'] for item in items if isinstance(item, dict) and item.get('link'))
+            count += len(items)
+            await f.write(''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in items))
+
+        async def fetch_page(page):
+            items, _ = await fetch_rest_json(session, url, {**params, 'page': page})
+            await write_page(items)
+
+        await write_page(first)
+        await asyncio.gather(*(fetch_page(page) for page in range(2, total_pages + 1)))
+    logger.info(f"Harvested {count} items from {route} ({total_pages} pages) → {out_path}")
+    return links
+
+async def harvest_rest_api(base_url, session, root_dir):
+    """Export all REST collections to JSON Lines and return the public links found in them."""
+    parsed = urlparse(base_url)
+    api_root = f"{parsed.scheme}://{parsed.netloc}/wp-json/"
+    out_dir = root_dir / CONFIG['rest_output']
+    out_dir.mkdir(parents=True, exist_ok=True)
+    routes = await discover_rest_routes(session, api_root)
+    results = await asyncio.gather(*(harvest_rest_collection(session, api_root, route, out_dir) for route in routes))
+    return [link for links in results for link in links]
+
+def range_validator(resp):
+    """Return a validator usable in If-Range (a strong ETag or Last-Modified), if any."""
+    etag = resp.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return resp.headers.get('Last-Modified')
+
+def client_timeout(profile):
+    """aiohttp.ClientTimeout for a request profile: page, asset or api."""
+    return aiohttp.ClientTimeout(**CONFIG['timeouts'][profile])
+
+def body_budget(resp):
+    """Seconds allowed for streaming a body of the response's Content-Length at min_throughput, or None."""
+    if resp.content_length is None:
+        return None
+    return CONFIG['body_timeout'] + resp.content_length / CONFIG['min_throughput']
+
+async def stream_to_file(resp, part_path, offset=0):
+    """Stream a response body to part_path chunk by chunk, appending after offset; return (sha256, length)."""
+    digest = hashlib.sha256()
+    length = offset
+    if offset:
+        async with aiofiles.open(part_path, 'rb') as f:
+            while True:
+                chunk = await f.read(CONFIG['chunk_size'])
+                if not chunk:
+                    break
+                digest.update(chunk)
+    async def copy(length):
+        started = time.monotonic()
+        async with aiofiles.open(part_path, 'ab' if offset else 'wb') as f:
+            async for chunk in resp.content.iter_chunked(CONFIG['chunk_size']):
+                digest.update(chunk)
+                length += len(chunk)
+                await f.write(chunk)
+                elapsed = time.monotonic() - started
+                if elapsed > CONFIG['body_timeout'] and (length - offset) / elapsed < CONFIG['min_throughput']:
+                    raise asyncio.TimeoutError(f"Body slower than {CONFIG['min_throughput']} bytes/s "
+                                               f"({length - offset} bytes in {elapsed:.0f}s)")
+        return length
+
+    # A timeout keeps what was written, so the retry resumes with a Range request
+    length = await asyncio.wait_for(copy(length), body_budget(resp))
+    return digest.hexdigest(), length
+
+class BlobStore:
+    """Content-addressed store for downloaded assets, keyed by SHA-256.
+
+    Each distinct body is kept once under blobs/<aa>/<digest> and the
+    URL-derived paths in output trees are hardlinks to it (copies when the
+    store lives on another filesystem). index.sqlite3 maps URL to digest and
+    validators, so a clone into a fresh directory can revalidate against the
+    store instead of downloading bytes it already has.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index = sqlite3.connect(self.root / 'index.sqlite3')
+        self.index.execute('PRAGMA journal_mode=WAL')
+        self.index.execute('PRAGMA synchronous=NORMAL')
+        self.index.execute('CREATE TABLE IF NOT EXISTS blobs (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, '
+                           'etag TEXT, last_modified TEXT)')
+        self.index.commit()
+
+    def blob_path(self, digest):
+        """Location of a blob, fanned out by the first byte of its digest."""
+        return self.root / 'blobs' / digest[:2] / digest
+
+    def lookup(self, url):
+        """Return (digest, etag, last_modified) for a URL whose blob is still present, else None."""
+        row = self.index.execute('SELECT sha256, etag, last_modified FROM blobs WHERE url = ?', (url,)).fetchone()
+        if row and self.blob_path(row[0]).exists():
+            return row
+        return None
+
+    def add(self, url, part_path, digest, resp):
+        """Move a finished download into the store (copying across filesystems), or drop it if the bytes are already there."""
+        blob = self.blob_path(digest)
+        if blob.exists():
+            part_path.unlink()
+        else:
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(part_path, blob)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # The store is on another filesystem: copy in beside the blob, then rename so it appears whole
+                tmp_path = blob.with_name(f"{blob.name}.{os.getpid()}.part")
+                shutil.copyfile(part_path, tmp_path)
+                os.replace(tmp_path, blob)
+                part_path.unlink()
+        self.index.execute('INSERT OR REPLACE INTO blobs (url, sha256, etag, last_modified) VALUES (?, ?, ?, ?)',
+                           (url, digest, resp.headers.get('ETag'), resp.headers.get('Last-Modified')))
+        self.index.commit()
+
+    def link(self, digest, dest_path):
+        """Place a blob at dest_path, replacing whatever was there atomically."""
+        blob = self.blob_path(digest)
+        # rename() is a no-op between two links to the same inode, so never try that
+        if dest_path.exists() and os.path.samefile(blob, dest_path):
+            return
+        tmp_path = dest_path.with_name(dest_path.name + '.link')
+        with contextlib.suppress(FileNotFoundError):
+            tmp_path.unlink()
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(blob, tmp_path)
+        except OSError:
+            shutil.copyfile(blob, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def close(self):
+        """Close the URL index."""
+        self.index.close()
+
+class FileWriter:
+    """Writer stage that keeps file system work off the event loop.
+
+    Finished contents go on a bounded queue and a small thread pool writes
+    each one to a temp file that is renamed into place. Directories already
+    created are cached for the run. With fsync_writes, files and their
+    directories are fsynced in batches of fsync_batch.
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=CONFIG['writer_queue'])
+        self.pool = ThreadPoolExecutor(max_workers=CONFIG['writer_threads'], thread_name_prefix='writer')
+        self.tasks = [asyncio.create_task(self.drain()) for _ in range(CONFIG['writer_threads'])]
+        self.dirs = set()
+        self.lock = threading.Lock()
+        self.unsynced = []
+        self.files = 0
+        self.bytes = 0
+        self.busy = 0.0  # Seconds spent in write_file, summed over threads
+        self.peak_depth = 0
+
+    async def write(self, path, data):
+        """Queue str or bytes to be written atomically to path; waits only while the queue is full.
+
+        Returns a future that resolves once the file is renamed into place, or
+        raises the write's error.
+        """
+        written = asyncio.get_running_loop().create_future()
+        with metrics.timer('stage', 'write_wait'):
+            await self.queue.put((path, data, written))
+        self.peak_depth = max(self.peak_depth, self.queue.qsize())
+        metrics.peak('writer_queue_depth', self.peak_depth)
+        return written
+
+    async def makedirs(self, directory):
+        """Create a directory in the pool unless this run already has."""
+        if directory not in self.dirs:
+            await self.call(self.ensure_dir, directory)
+
+    async def call(self, func, *args):
+        """Run other blocking file system work on the writer threads."""
+        return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+
+    async def drain(self):
+        """Hand queued writes to the thread pool one at a time."""
+        while True:
+            path, data, written = await self.queue.get()
+            try:
+                with metrics.timer('stage', 'write'):
+                    await self.call(self.write_file, path, data)
+                written.set_result(path)
+            except Exception as e:
+                logger.error(f"Failed to write {path}: {e}")
+                written.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def ensure_dir(self, directory):
+        """mkdir -p, at most once per directory per run."""
+        if directory not in self.dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self.dirs.add(directory)
+
+    def write_file(self, path, data):
+        """Write one file as temp file + rename; runs on a writer thread."""
+        start = time.perf_counter()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.ensure_dir(path.parent)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.files += 1
+            self.bytes += len(data)
+            self.busy += time.perf_counter() - start
+            if not CONFIG['fsync_writes']:
+                return
+            self.unsynced.append(path)
+            if len(self.unsynced) < CONFIG['fsync_batch']:
+                return
+            batch, self.unsynced = self.unsynced, []
+        self.fsync(batch)
+
+    def fsync(self, paths):
+        """Flush a batch of renamed files, then their directories, to stable storage."""
+        for path in paths + sorted({path.parent for path in paths}):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    async def close(self):
+        """Wait for queued writes, flush the last fsync batch and log throughput."""
+        await self.queue.join()
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.unsynced:
+            await self.call(self.fsync, self.unsynced)
+            self.unsynced = []
+        self.pool.shutdown()
+        metrics.inc('written_files', self.files)
+        metrics.inc('written_bytes', self.bytes)
+        busy = max(self.busy, 1e-9)
+        logger.info(f"Writer: {self.files} files, {self.bytes / 1e6:.1f} MB in {self.busy:.2f}s of write time "
+                    f"({self.files / busy:.0f} files/s, {self.bytes / 1e6 / busy:.1f} MB/s), "
+                    f"peak queue depth {self.peak_depth}/{CONFIG['writer_queue']}")
+
+async def save_resource(url, dest_path, session, journal, validator=None):
+    """Download and save a resource asynchronously, deferring retryable failures to the retry queue."""
+    if dest_path.exists() and (not CONFIG['conditional_get'] or url in revalidated_urls):
+        return dest_path.name
+    headers = conditional_headers(journal, url, dest_path)
+    stored = blob_store.lookup(url) if blob_store and not dest_path.exists() else None
+    if stored and CONFIG['conditional_get']:
+        # Another clone already holds these bytes; ask the origin whether they are still current
+        headers = {k: v for k, v in (('If-None-Match', stored[1]), ('If-Modified-Since', stored[2])) if v}
+    part_path = dest_path.with_name(dest_path.name + '.part')
+    # validator is the If-Range validator of the response that wrote part_path in an earlier attempt
+    offset = part_path.stat().st_size if validator and part_path.exists() else 0
+    range_headers = {'Range': f'bytes={offset}-', 'If-Range': validator} if offset else {}
+    try:
+        async with fetch(session, url, headers={**headers, **range_headers}, timeout=client_timeout('asset')) as resp:
+            if resp.status == 304:
+                revalidated_urls.add(url)
+                if stored and headers:
+                    digest, etag, last_modified = stored
+                    await file_writer.call(blob_store.link, digest, dest_path)
+                    journal.execute('INSERT OR REPLACE INTO validators (url, etag, last_modified, sha256) '
+                                    'VALUES (?, ?, ?, ?)', (url, etag, last_modified, digest))
+                    logger.info(f"Linked from blob store: {url} → {dest_path}")
+                return dest_path.name
+            if resp.status == 416 and offset:
+                # Partial copy is unusable; the retry starts from scratch
+                validator = None
+                raise aiohttp.ClientPayloadError(f"Range {offset}- no longer satisfiable")
+            resp.raise_for_status()
+            content_type = resp.headers.get('Content-Type', '').lower()
+            if 'text/html' in content_type:
+                body = await resp.read()
+                digest, length = hashlib.sha256(body).hexdigest(), len(body)
+                if CONFIG['rewrite_mode'] == 'splice':
+                    page_text = body  # Nothing in it is rewritten, so keep the original bytes
+                else:
+                    page_text = BeautifulSoup(body, 'html.parser',
+                                              from_encoding=sniff_charset(body, resp.charset)).prettify('utf-8')
+            else:
+                await file_writer.makedirs(dest_path.parent)
+                # Anything but 206 means the server ignored Range and sent the whole body
+                if resp.status != 206:
+                    offset = 0
+                validator = range_validator(resp)
+                digest, length = await stream_to_file(resp, part_path, offset)
+            revalidated_urls.add(url)
+            if not store_validators(journal, url, resp, digest, length) and dest_path.exists():
+                if part_path.exists():
+                    part_path.unlink()
+                return dest_path.name
+            if 'text/html' in content_type:
+                await (await file_writer.write(dest_path, page_text))
+            elif blob_store:
+                blob_store.add(url, part_path, digest, resp)
+                await file_writer.call(blob_store.link, digest, dest_path)
+            else:
+                os.replace(part_path, dest_path)
+            logger.info(f"Saved resource: {url} → {dest_path}")
+            return dest_path.name
+    except Exception as e:
+        if retry_queue.schedule(url, e, lambda: save_asset(url, dest_path, session, journal, validator)):
+            return None
+        if part_path.exists():
+            part_path.unlink()
+        logger.error(f"Failed to download {url}: {e}")
+        return None
+
+async def download_asset(url, dest_path, session, journal, validator=None):
+    """Run one save_resource for url and remember a successful result in the per-run registry."""
+    try:
+        name = await save_resource(url, dest_path, session, journal, validator)
+        if name:
+            saved_assets[url] = name
+        return name
+    finally:
+        del asset_downloads[url]
+
+async def save_asset(url, dest_path, session, journal, validator=None):
+    """Save an asset at most once per run; concurrent requesters await the download already in flight."""
+    if url in saved_assets:
+        metrics.inc('assets', 1, 'registry_hit')
+        return saved_assets[url]
+    if url in retry_queue or url in retry_queue.failures:
+        # A retry is already scheduled, or the URL was given up on earlier in this run
+        metrics.inc('assets', 1, 'deferred')
+        return None
+    task = asset_downloads.get(url)
+    if task is None:
+        metrics.inc('assets', 1, 'download')
+        task = asset_downloads[url] = asyncio.create_task(download_asset(url, dest_path, session, journal, validator))
+    else:
+        metrics.inc('assets', 1, 'coalesced')
+    # Shielded so one cancelled page does not abort the download for the others waiting on it
+    return await asyncio.shield(task)
+
+def query_tag(query):
+    """Filename-safe tag for a canonical query string, so each query variant gets its own file."""
+    tag = re.sub(r'[^A-Za-z0-9.]+', '-', unquote(query)).strip('-.')
+    if len(tag) > 40 or not tag:
+        tag = hashlib.blake2b(query.encode('utf-8'), digest_size=6).hexdigest()
+    return tag
 
 def url_to_filepath(url, base_domain, root_dir):
     """Map a URL to a local file path, preserving WordPress structure."""
     parsed = urlparse(url)
     path = unquote(parsed.path).lstrip('/')
     if not path:
-        return Path(root_dir) / 'index.php'
-    if any(path.startswith(folder) for folder in CONFIG['wp_folders']):
-        return Path(root_dir) / path
-    if path.endswith('.php') and '/' not in path:
-        return Path(root_dir) / path
-    if not os.path.splitext(path)[1]:
-        return Path(root_dir) / path / 'index.html'
-    return Path(root_dir) / path
-
-def extract_page_data(url, html_content, base_url):
-    """Extract title, content, and slug from HTML."""
-    soup = BeautifulSoup(html_content, 'html.parser')
-    # Extract title
-    title_tag = soup.find('title')
+        local_path = Path(root_dir) / 'index.php'
+    elif any(path.startswith(folder) for folder in CONFIG['wp_folders']):
+        local_path = Path(root_dir) / path
+    elif path.endswith('.php') and '/' not in path:
+        local_path = Path(root_dir) / path
+    elif not os.path.splitext(path)[1]:
+        local_path = Path(root_dir) / path / 'index.html'
+    else:
+        local_path = Path(root_dir) / path
+    if parsed.query:
+        # style.css?ver=6.5 -> style.ver-6.5.css, /blog/?paged=2 -> blog/index.paged-2.html
+        local_path = local_path.with_name(f"{local_path.stem}.{query_tag(parsed.query)}{local_path.suffix}")
+    return local_path
+
+META_CHARSET_RE = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+BOMS = ((codecs.BOM_UTF8, 'utf-8'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+
+def sniff_charset(body, declared=None):
+    """Charset of an HTML body from its BOM, the Content-Type charset or a <meta> in its prefix; else UTF-8 or cp1252."""
+    for bom, name in BOMS:
+        if body.startswith(bom):
+            return name
+    prefix = body[:CONFIG['charset_sniff']]
+    if declared:
+        with contextlib.suppress(LookupError):
+            return codecs.lookup(declared).name
+    match = META_CHARSET_RE.search(prefix)
+    if match:
+        with contextlib.suppress(LookupError):
+            return codecs.lookup(match.group(1).decode('ascii')).name
+    # Undeclared: UTF-8 if the prefix decodes (a character cut off by the sniff window is fine), else Windows-1252
+    try:
+        prefix.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.reason != 'unexpected end of data' or len(body) <= CONFIG['charset_sniff']:
+            return 'cp1252'
+    return 'utf-8'
+
+def make_soup(markup, charset=None):
+    """Build a full BeautifulSoup tree with the configured backend, decoding bytes as charset."""
+    # from_encoding spares BeautifulSoup its own encoding detection
+    kwargs = {'from_encoding': charset} if isinstance(markup, bytes) and charset else {}
+    if CONFIG['parser_backend'] in ('lxml', 'fast') and HAVE_LXML:
+        return BeautifulSoup(markup, 'lxml', **kwargs)
+    return BeautifulSoup(markup, 'html.parser', **kwargs)
+
+# Tags scanned by the 'fast' backend. Comments are matched so they can be skipped,
+# and the raw text of <script>/<style> is jumped over so links in JS strings are ignored.
+LINK_TAG_RE = re.compile(
+    r'<!--.*?-->|<(?P<tag>a|link|script|img|source|style)(?=[\s/>])(?P<attrs>(?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+    re.I | re.S)
+LINK_ATTR_RE = re.compile(
+    r'(?<![^\s"\'/])(?P<name>href|src)\s*=\s*(?P<raw>"(?P<dq>[^"]*)"|\'(?P<sq>[^\']*)\'|(?P<uq>[^\s>]+))', re.I)
+RAW_TEXT_END_RE = {
+    'script': re.compile(r'</script\s*>', re.I),
+    'style': re.compile(r'</style\s*>', re.I),
+}
+LINK_ATTRS = {'a': 'href', 'link': 'href', 'script': 'src', 'img': 'src', 'source': 'src'}
+
+def bytes_pattern(pattern):
+    """The same (ASCII-only) regex compiled for bytes."""
+    return re.compile(pattern.pattern.encode('ascii'), pattern.flags & ~re.UNICODE)
+
+# Scanner patterns by markup type; the bytes ones work on any ASCII-compatible encoding
+SCAN_PATTERNS = {
+    str: (LINK_TAG_RE, LINK_ATTR_RE, RAW_TEXT_END_RE),
+    bytes: (bytes_pattern(LINK_TAG_RE), bytes_pattern(LINK_ATTR_RE),
+            {tag: bytes_pattern(pattern) for tag, pattern in RAW_TEXT_END_RE.items()}),
+}
+
+def ascii_compatible(charset):
+    """True if markup in charset can be scanned and spliced as bytes (UTF-8 and single-byte codecs, not UTF-16)."""
+    return '<a href="x">'.encode(charset, errors='replace') == b'<a href="x">'
+
+def scan_link_attrs(markup, charset='utf-8'):
+    """Yield (tag, value, start, end) for the href/src attribute of each link-bearing tag.
+
+    markup is text, or bytes in an ASCII-compatible charset. start/end delimit
+    the raw attribute value (including quotes) in markup, so callers can
+    splice replacements in without building a tree.
+    """
+    tag_re, attr_re, raw_text_end = SCAN_PATTERNS[type(markup)]
+    text = (lambda raw: raw.decode(charset, errors='replace')) if isinstance(markup, bytes) else str
+    pos = 0
+    while True:
+        m = tag_re.search(markup, pos)
+        if not m:
+            return
+        pos = m.end()
+        tag = m.group('tag')
+        if not tag:
+            continue
+        tag = text(tag).lower()
+        wanted = LINK_ATTRS.get(tag)
+        if wanted:
+            for am in attr_re.finditer(markup, m.start('attrs'), m.end('attrs')):
+                if text(am.group('name')).lower() == wanted:
+                    value = next(v for v in am.group('dq', 'sq', 'uq') if v is not None)
+                    yield (tag, html.unescape(text(value))) + am.span('raw')
+                    break
+        if tag in raw_text_end:
+            end = raw_text_end[tag].search(markup, pos)
+            pos = end.end() if end else len(markup)
+
+def splice(markup, edits, charset='utf-8'):
+    """Replace (start, end, value) spans in markup (text, or bytes in charset) with quoted attribute values."""
+    parts = []
+    last = 0
+    for start, end, value in sorted(edits):
+        parts.append(markup[last:start])
+        quoted = '"' + html.escape(value, quote=True) + '"'
+        parts.append(quoted.encode(charset, errors='xmlcharrefreplace') if isinstance(markup, bytes) else quoted)
+        last = end
+    parts.append(markup[last:])
+    return markup[:0].join(parts)
+
+CONTENT_SELECTORS = ['main', 'article', '#content', '.content', '.entry-content', 'body']
+
+def visit_page(soup):
+    """Walk the tree once, collecting everything rewriting and WXR extraction need.
+
+    Returns (asset_elements, hrefs, title_tag, content_elem): asset_elements
+    are (element, attr) pairs for link/script/img/source tags, hrefs the set
+    of raw <a href> values, and content_elem the first match of the
+    highest-priority entry in CONTENT_SELECTORS.
+    """
+    asset_elements = []
+    hrefs = set()
+    title_tag = None
+    candidates = {}
+    for element in soup.find_all(True):
+        name = element.name
+        attr = LINK_ATTRS.get(name)
+        if attr and element.has_attr(attr):
+            if name == 'a':
+                hrefs.add(element[attr])
+            else:
+                asset_elements.append((element, attr))
+        if name == 'title' and title_tag is None:
+            title_tag = element
+        if name in ('main', 'article', 'body'):
+            candidates.setdefault(name, element)
+        if element.get('id') == 'content':
+            candidates.setdefault('#content', element)
+        classes = element.get('class') or ()
+        if 'content' in classes:
+            candidates.setdefault('.content', element)
+        if 'entry-content' in classes:
+            candidates.setdefault('.entry-content', element)
+    content_elem = next((candidates[sel] for sel in CONTENT_SELECTORS if sel in candidates), None)
+    return asset_elements, hrefs, title_tag, content_elem
+
+def page_record(url, title_tag, content_elem):
+    """Build the WXR page record from the title and main content found by visit_page."""
     title = title_tag.text.strip() if title_tag else os.path.basename(urlparse(url).path) or 'Untitled'
-    # Extract main content (try common selectors)
-    content_selectors = ['main', 'article', '#content', '.content', '.entry-content', 'body']
-    content = None
-    for selector in content_selectors:
-        content_elem = soup.select_one(selector)
-        if content_elem:
-            content = str(content_elem)
-            break
-    if not content:
-        content = str(soup.body) if soup.body else ''
+    content = str(content_elem) if content_elem else ''
     # Generate slug
     parsed = urlparse(url)
     path = parsed.path.rstrip('/').lstrip('/')
@@ -231,136 +1486,410 @@ def extract_page_data(url, html_content, base_url):
         'url': url,
     }
 
+def extract_page_data(url, html_content, base_url, charset=None):
+    """Extract title, content, and slug from HTML."""
+    _, _, title_tag, content_elem = visit_page(make_soup(html_content, charset))
+    return page_record(url, title_tag, content_elem)
+
+WXR_NAMESPACES = {
+    'xmlns:excerpt': 'http://wordpress.org/export/1.2/excerpt/',
+    'xmlns:content': 'http://purl.org/rss/1.0/modules/content/',
+    'xmlns:wfw': 'http://wellformedweb.org/CommentAPI/',
+    'xmlns:dc': 'http://purl.org/dc/elements/1.1/',
+    'xmlns:wp': 'http://wordpress.org/export/1.2/',
+}
+INVALID_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+def cdata(text):
+    """Wrap text in a CDATA section, splitting any ']]>' so it cannot close the section early."""
+    text = INVALID_XML_CHARS_RE.sub('', text or '')
+    return '<![CDATA[' + text.replace(']]>', ']]]]><![CDATA[>') + ']]>'
+
+class WxrWriter:
+    """Stream a WordPress WXR export to disk one <item> at a time.
+
+    Items are written as pages finish, so memory does not grow with the
+    number of pages. The export is built in a .part file and renamed into
+    place by close(); an export without items is discarded.
+    """
+
+    def __init__(self, output_path, base_url):
+        self.output_path = Path(output_path)
+        self.part_path = self.output_path.with_name(self.output_path.name + '.part')
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        now = datetime.datetime.utcnow()
+        self.pub_date = now.strftime('%a, %d %b %Y %H:%M:%S +0000')
+        self.post_date = now.strftime('%Y-%m-%d %H:%M:%S')
+        self.file = open(self.part_path, 'w', encoding='utf-8')
+        self.xml = XMLGenerator(self.file, encoding='utf-8')
+        self.xml.startDocument()
+        self.xml.startElement('rss', {'version': '2.0', **WXR_NAMESPACES})
+        self.newline(1)
+        self.xml.startElement('channel', {})
+        self.element('title', urlparse(base_url).netloc, 2)
+        self.element('link', base_url, 2)
+        self.element('description', 'Exported WordPress content', 2)
+        self.element('pubDate', self.pub_date, 2)
+        self.element('language', 'en-US', 2)
+        self.element('wp:wxr_version', '1.2', 2)
+
+    def newline(self, depth):
+        """Indent the next element to the given depth."""
+        self.xml.ignorableWhitespace('\n' + '  ' * depth)
+
+    def element(self, name, text, depth, attrs=None):
+        """Write a text-only element."""
+        self.newline(depth)
+        self.xml.startElement(name, attrs or {})
+        self.xml.characters(INVALID_XML_CHARS_RE.sub('', text))
+        self.xml.endElement(name)
+
+    def write_item(self, page):
+        """Append one page to the export."""
+        self.newline(2)
+        self.xml.startElement('item', {})
+        self.element('title', page['title'], 3)
+        self.element('link', page['url'], 3)
+        self.element('pubDate', self.pub_date, 3)
+        self.element('dc:creator', 'admin', 3)
+        self.element('guid', page['url'], 3, {'isPermaLink': 'false'})
+        self.element('description', '', 3)
+        # XMLGenerator has no CDATA support and writes straight through to the file
+        self.newline(3)
+        self.file.write(f'<content:encoded>{cdata(page["content"])}</content:encoded>')
+        self.element('wp:post_id', str(hash(page['url']) % 1000000), 3)
+        self.element('wp:post_date', self.post_date, 3)
+        self.element('wp:post_date_gmt', self.post_date, 3)
+        self.element('wp:comment_status', 'closed', 3)
+        self.element('wp:ping_status', 'closed', 3)
+        self.element('wp:post_name', page['slug'], 3)
+        self.element('wp:status', 'publish', 3)
+        self.element('wp:post_parent', '0', 3)
+        self.element('wp:menu_order', '0', 3)
+        self.element('wp:post_type', 'page', 3)
+        self.element('wp:post_password', '', 3)
+        self.element('wp:is_sticky', '0', 3)
+        self.newline(2)
+        self.xml.endElement('item')
+        self.count += 1
+
+    def close(self):
+        """Finish the document and move it into place."""
+        self.newline(1)
+        self.xml.endElement('channel')
+        self.newline(0)
+        self.xml.endElement('rss')
+        self.xml.endDocument()
+        self.file.write('\n')
+        self.file.close()
+        if not self.count:
+            self.part_path.unlink()
+            return
+        os.replace(self.part_path, self.output_path)
+        logger.info(f"Generated WXR XML file: {self.output_path} ({self.count} pages)")
+
 def generate_wxr_xml(pages, output_path, base_url):
     """Generate WordPress WXR XML file from pages."""
-    root = ET.Element('rss')
-    root.set('version', '2.0')
-    root.set('xmlns:excerpt', 'http://wordpress.org/export/1.2/excerpt/')
-    root.set('xmlns:content', 'http://purl.org/rss/1.0/modules/content/')
-    root.set('xmlns:wfw', 'http://wellformedweb.org/CommentAPI/')
-    root.set('xmlns:dc', 'http://purl.org/dc/elements/1.1/')
-    root.set('xmlns:wp', 'http://wordpress.org/export/1.2/')
-
-    channel = ET.SubElement(root, 'channel')
-    ET.SubElement(channel, 'title').text = urlparse(base_url).netloc
-    ET.SubElement(channel, 'link').text = base_url
-    ET.SubElement(channel, 'description').text = 'Exported WordPress content'
-    ET.SubElement(channel, 'pubDate').text = datetime.datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S +0000')
-    ET.SubElement(channel, 'language').text = 'en-US'
-    ET.SubElement(channel, 'wp:wxr_version').text = '1.2'
-
+    wxr = WxrWriter(output_path, base_url)
     for page in pages:
-        item = ET.SubElement(channel, 'item')
-        ET.SubElement(item, 'title').text = page['title']
-        ET.SubElement(item, 'link').text = page['url']
-        ET.SubElement(item, 'pubDate').text = datetime.datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S +0000')
-        ET.SubElement(item, 'dc:creator').text = 'admin'
-        ET.SubElement(item, 'guid', isPermaLink='false').text = page['url']
-        ET.SubElement(item, 'description')  # Empty
-        content_encoded = ET.SubElement(item, 'content:encoded')
-        content_encoded.text = f'<![CDATA[{page["content"]}]]>'
-        ET.SubElement(item, 'wp:post_id').text = str(hash(page['url']) % 1000000)
-        ET.SubElement(item, 'wp:post_date').text = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-        ET.SubElement(item, 'wp:post_date_gmt').text = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-        ET.SubElement(item, 'wp:comment_status').text = 'closed'
-        ET.SubElement(item, 'wp:ping_status').text = 'closed'
-        ET.SubElement(item, 'wp:post_name').text = page['slug']
-        ET.SubElement(item, 'wp:status').text = 'publish'
-        ET.SubElement(item, 'wp:post_parent').text = '0'
-        ET.SubElement(item, 'wp:menu_order').text = '0'
-        ET.SubElement(item, 'wp:post_type').text = 'page'
-        ET.SubElement(item, 'wp:post_password').text = ''
-        ET.SubElement(item, 'wp:is_sticky').text = '0'
-
-    # Pretty-print XML
-    rough_string = ET.tostring(root, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    pretty_xml = reparsed.toprettyxml(indent="  ", encoding='utf-8').decode('utf-8')
-
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(pretty_xml)
-    logger.info(f"Generated WXR XML file: {output_path}")
-
-async def process_url(url, base_domain, root_dir, session, visited, queue, pages):
+        wxr.write_item(page)
+    wxr.close()
+
+def init_parse_worker(config):
+    """Install the crawl configuration in a parse worker process."""
+    global CONFIG
+    CONFIG = config
+
+def parse_page(norm_url, markup, base_domain, root_dir, local_path, serialize=True, charset=None, timings=None):
+    """Parse a page, rewrite its asset links and collect links, assets and page data.
+
+    Runs in the parse process pool so the event loop only does I/O. markup is
+    the raw body as bytes in charset, or text. Returns (rewritten_html, links,
+    assets, page_data) where rewritten_html is encoded bytes ready to write,
+    assets is a list of (url, local_path) pairs and page_data is None unless
+    XML export applies. If timings is a dict, CPU seconds per step are added.
+    """
+    timings = {} if timings is None else timings
+    clock = time.process_time()
+    if isinstance(markup, bytes) and not charset:
+        charset = sniff_charset(markup)
+    want_xml = CONFIG['generate_xml'] and local_path.suffix == '.html'
+    page_data = None
+    if CONFIG['parser_backend'] == 'fast' or CONFIG['rewrite_mode'] == 'splice':
+        # The scanner finds links and swaps asset links in the original bytes
+        rewritten, hrefs, assets = rewrite_links_fast(norm_url, markup, base_domain, root_dir, local_path, charset or 'utf-8')
+        timings['parse'] = time.process_time() - clock
+        if want_xml:
+            # Only the WXR extraction needs a full tree
+            page_data = extract_page_data(norm_url, markup, CONFIG['base_url'], charset)
+        timings['extract'] = time.process_time() - clock - timings['parse']
+    else:
+        soup = make_soup(markup, charset)
+        asset_elements, hrefs, title_tag, content_elem = visit_page(soup)
+        if want_xml:
+            # Serialize the content before its asset links are rewritten for local use
+            page_data = page_record(norm_url, title_tag, content_elem)
+        timings['parse'] = time.process_time() - clock
+        assets = rewrite_asset_elements(asset_elements, norm_url, base_domain, root_dir, local_path)
+        # Encoding on output also points any <meta charset> at UTF-8
+        rewritten = soup.prettify('utf-8') if serialize else None
+        timings['serialize'] = time.process_time() - clock - timings['parse']
+    if isinstance(rewritten, str):
+        rewritten = rewritten.encode('utf-8')
+    # Collapse repeated hrefs (menus, footers) before resolving them
+    links = [urljoin(norm_url, href) for href in hrefs]
+    return rewritten, links, assets, page_data
+
+def timed_parse_page(*args):
+    """Run parse_page and return its result with the CPU seconds each step took."""
+    timings = {}
+    return parse_page(*args, timings=timings), timings
+
+def is_asset_url(abs_href, base_domain, classifier=None):
+    """Check whether a resolved href is a same-site asset that should be downloaded."""
+    return classify_url(abs_href, base_domain, classifier) == 'asset'
+
+def rewrite_asset_elements(asset_elements, norm_url, base_domain, root_dir, local_path):
+    """Point asset elements found by visit_page at their local copies; return (url, path) pairs."""
+    assets = []
+    rules = query_rules()
+    classifier = url_classifier()
+    for element, attr in asset_elements:
+        abs_href = urljoin(norm_url, element[attr])
+        if is_asset_url(abs_href, base_domain, classifier):
+            asset_url = normalize_url(abs_href, rules)
+            asset_path = url_to_filepath(asset_url, base_domain, root_dir)
+            assets.append((asset_url, asset_path))
+            element[attr] = make_relative(local_path, asset_path)
+    return assets
+
+def rewrite_links_fast(norm_url, markup, base_domain, root_dir, local_path, charset='utf-8'):
+    """Rewrite asset links in place with the attribute scanner, leaving every other byte of the page untouched."""
+    if isinstance(markup, bytes) and not ascii_compatible(charset):
+        text, hrefs, assets = rewrite_links_fast(norm_url, markup.decode(charset, errors='replace'),
+                                                 base_domain, root_dir, local_path)
+        return text.encode(charset, errors='xmlcharrefreplace'), hrefs, assets
+    assets = []
+    hrefs = set()
+    edits = []
+    rules = query_rules()
+    classifier = url_classifier()
+    for tag, value, start, end in scan_link_attrs(markup, charset):
+        if tag == 'a':
+            hrefs.add(value)
+            continue
+        abs_href = urljoin(norm_url, value)
+        if is_asset_url(abs_href, base_domain, classifier):
+            asset_url = normalize_url(abs_href, rules)
+            asset_path = url_to_filepath(asset_url, base_domain, root_dir)
+            assets.append((asset_url, asset_path))
+            edits.append((start, end, make_relative(local_path, asset_path)))
+    return splice(markup, edits, charset), hrefs, assets
+
+async def process_url(norm_url, base_domain, root_dir, session, seen, queue, wxr, journal, parse_pool, depth=0):
     """Process a single URL and its resources."""
-    norm_url = normalize_url(url)
-    if not norm_url or norm_url in visited or not is_valid_url(norm_url, base_domain):
-        return
-    if len(visited) >= CONFIG['max_pages']:
-        logger.info(f"Reached max pages limit ({CONFIG['max_pages']})")
-        return
-    visited.add(norm_url)
+    # norm_url was normalized, validated and deduplicated by enqueue_url
     logger.info(f"Fetching: {norm_url}")
 
+    local_path = url_to_filepath(norm_url, base_domain, root_dir)
+    changed = True
+    headers = conditional_headers(journal, norm_url, local_path)
+    want_xml = CONFIG['generate_xml'] and local_path.suffix == '.html'
+    stored_links = stored_page_links(journal, norm_url) if headers else None
+    stored_record = stored_page_record(journal, norm_url) if want_xml and headers else None
+    if headers and 'text/html' in stored_content_type(journal, norm_url) and (
+            stored_links is None or (want_xml and stored_record is None)):
+        # A 304 could not supply the page's links, assets or WXR record, so fetch the page in full
+        headers = {}
     try:
-        async with session.get(norm_url, timeout=CONFIG['timeout']) as resp:
-            resp.raise_for_status()
-            content_type = resp.headers.get('Content-Type', '').lower()
-            if 'text/html' not in content_type and not norm_url.endswith(('.php', '.css', '.js')):
+        async with fetch(session, norm_url, headers=headers, timeout=client_timeout('page')) as resp:
+            not_modified = resp.status == 304
+            if not_modified:
+                content_type = stored_content_type(journal, norm_url)
+            else:
+                resp.raise_for_status()
+                content_type = resp.headers.get('Content-Type', '').lower()
+            if 'text/html' not in content_type and not urlparse(norm_url).path.endswith(('.php', '.css', '.js')):
                 return
-            html_text = await resp.text() if 'text/html' in content_type else None
+            body = None
+            if 'text/html' in content_type and not not_modified:
+                body = await resp.read()
+                changed = store_validators(journal, norm_url, resp, hashlib.sha256(body).hexdigest(), len(body)) or not local_path.exists()
+                charset = sniff_charset(body, resp.charset)
     except Exception as e:
+        url_class = frontier_class(norm_url, base_domain)
+        if retry_queue.schedule(norm_url, e, lambda: queue.push(norm_url, url_class, depth)):
+            return
         logger.error(f"Failed to fetch {norm_url}: {e}")
+        record_url(journal, norm_url, 'failed', str(e))
         return
 
-    local_path = url_to_filepath(norm_url, base_domain, root_dir)
-    if html_text:
-        soup = BeautifulSoup(html_text, 'html.parser')
-        tasks = []
-        for tag, attr in [
-            ('link', 'href'),
-            ('script', 'src'),
-            ('img', 'src'),
-            ('source', 'src'),
-        ]:
-            for element in soup.find_all(tag, **{attr: True}):
-                href = element[attr]
-                abs_href = urljoin(norm_url, href)
-                if any(abs_href.endswith(ext) for ext in CONFIG['asset_types']) and not any(re.match(pat, abs_href) for pat in CONFIG['exclude_patterns']):
-                    if is_valid_url(abs_href, base_domain):
-                        asset_path = url_to_filepath(abs_href, base_domain, root_dir)
-                        tasks.append(save_resource(abs_href, asset_path, session))
-                        element[attr] = make_relative(local_path, asset_path)
-        await asyncio.gather(*tasks, return_exceptions=True)
-        for a in soup.find_all('a', href=True):
-            abs_link = urljoin(norm_url, a['href'])
-            child = normalize_url(abs_link)
-            if child and is_valid_url(child, base_domain) and child not in visited:
-                queue.append(child)
-        local_path.parent.mkdir(parents=True, exist_ok=True)
-        async with aiofiles.open(local_path, 'w', encoding='utf-8') as f:
-            await f.write(soup.prettify())
+    if not_modified:
+        if 'text/html' not in content_type:
+            revalidated_urls.add(norm_url)
+            logger.info(f"Not modified: {norm_url}")
+            return
+        # Unchanged upstream. The saved copy has its asset links rewritten to local files,
+        # so the links, assets and record come from the page's last full fetch instead
+        changed = False
+        links, asset_urls = stored_links
+        assets = [(asset_url, url_to_filepath(asset_url, base_domain, root_dir)) for asset_url in asset_urls]
+        page_data = stored_record
+    elif body:
+        loop = asyncio.get_running_loop()
+        with metrics.timer('stage', 'parse'):
+            (rewritten, links, assets, page_data), timings = await loop.run_in_executor(
+                parse_pool, timed_parse_page, norm_url, body, base_domain, root_dir, local_path, changed, charset)
+        for step, seconds in timings.items():
+            metrics.observe('parse_cpu', seconds, step)
+        record_page_links(journal, norm_url, links, [asset_url for asset_url, _ in assets])
+    else:
+        await save_asset(norm_url, local_path, session, journal)
+        return
+
+    enqueue_urls(links, base_domain, queue, seen, journal, depth=depth + 1)
+    with metrics.timer('stage', 'assets'):
+        await asyncio.gather(*(save_asset(asset_url, asset_path, session, journal) for asset_url, asset_path in assets),
+                             return_exceptions=True)
+    if changed:
+        # The journal marks the page done once this returns, so wait until the file is in place
+        try:
+            await (await file_writer.write(local_path, rewritten))
+        except OSError as e:
+            record_url(journal, norm_url, 'failed', str(e))
+            return
         logger.info(f"Saved page: {local_path}")
-        # Collect page data for XML
-        if CONFIG['generate_xml'] and local_path.suffix == '.html':
-            page_data = extract_page_data(norm_url, html_text, CONFIG['base_url'])
-            pages.append(page_data)
     else:
-        await save_resource(norm_url, local_path, session)
+        logger.info(f"Not modified: {local_path}")
+    # Stream page data into the XML export
+    if page_data:
+        wxr.write_item(page_data)
+        record_page(journal, page_data)
 
 def make_relative(from_path, to_path):
     """Create a relative path from one path to another."""
     rel = os.path.relpath(to_path, os.path.dirname(from_path))
     return rel.replace(os.sep, '/')
 
-async def scrape_wp_site(base_url=None, output_root=None, username=None, password=None):
+def make_connector():
+    """Build the keep-alive connection pool shared by every request of the crawl."""
+    ssl_context = ssl.create_default_context(cafile=CONFIG['ca_bundle']) if CONFIG['verify_ssl'] else False
+    return aiohttp.TCPConnector(
+        ssl=ssl_context,
+        limit=CONFIG['pool_size'],
+        limit_per_host=int(CONFIG['host_max_concurrent']),
+        keepalive_timeout=CONFIG['keepalive_timeout'],
+        use_dns_cache=True,
+        ttl_dns_cache=CONFIG['dns_cache_ttl'],
+    )
+
+def connection_trace(stats):
+    """Return a TraceConfig that counts requests, new and reused connections and DNS lookups into stats."""
+    async def on_request_start(session, ctx, params):
+        stats['requests'] += 1
+        ctx.https = params.url.scheme == 'https'
+
+    async def on_connection_create_end(session, ctx, params):
+        stats['new_connections'] += 1
+        if getattr(ctx, 'https', False):
+            stats['tls_handshakes'] += 1
+
+    async def on_connection_reuseconn(session, ctx, params):
+        stats['reused_connections'] += 1
+
+    async def on_dns_cache_hit(session, ctx, params):
+        stats['dns_cache_hits'] += 1
+
+    async def on_dns_cache_miss(session, ctx, params):
+        stats['dns_cache_misses'] += 1
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace
+
+def log_connection_stats(stats):
+    """Log how well the connection pool was reused during the crawl."""
+    connections = stats['new_connections'] + stats['reused_connections']
+    reuse = stats['reused_connections'] / connections if connections else 0.0
+    logger.info(f"Connections: {stats['requests']} requests, {stats['new_connections']} opened "
+                f"({stats['tls_handshakes']} TLS handshakes), {stats['reused_connections']} reused ({reuse:.0%}), "
+                f"DNS cache {stats['dns_cache_hits']} hits / {stats['dns_cache_misses']} misses")
+
+async def run_workers(queue, handler, num_workers, retries=None):
+    """Drain the frontier with a pool of long-lived workers until it and the retry queue are empty and idle."""
+    async def worker():
+        while True:
+            url, url_class, depth = await queue.get()
+            try:
+                await handler(url, url_class, depth)
+            except Exception as e:
+                logger.error(f"Worker failed on {url}: {e}")
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(num_workers)]
+    if retries is not None:
+        workers.append(asyncio.create_task(retries.run()))
+    try:
+        # join() only returns once every queued URL, including links found mid-crawl, is done
+        await queue.join()
+        # Retries may push pages back onto the frontier, so alternate until both are idle
+        while retries:
+            await retries.drain()
+            await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+def write_metrics(root_dir, conn_stats, failed, queue):
+    """Fold the crawl totals into the metrics and write the JSON summary under output_root."""
+    for name, value in conn_stats.items():
+        metrics.inc(name, value)
+    for url_class, value in queue.taken.items():
+        metrics.inc('crawled', value, url_class)
+    metrics.inc('failed', failed)
+    metrics.inc('skipped', queue.skipped)
+    summary = metrics.summary()
+    metrics_path = root_dir / CONFIG['metrics_file']
+    with open(metrics_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    logger.info(f"Metrics: {summary['requests_per_second']} requests/s, "
+                f"{summary['bytes_per_second'] / 1e6:.2f} MB/s received → {metrics_path}")
+
+async def scrape_wp_site(base_url=None, output_root=None, username=None, password=None, resume=False):
     """Main WordPress cloning function."""
-    global CONFIG
+    global CONFIG, blob_store, file_writer, metrics, retry_queue
     CONFIG['base_url'] = base_url or CONFIG['base_url']
     CONFIG['output_root'] = output_root or CONFIG['output_root']
     CONFIG['username'] = username or CONFIG['username']
     CONFIG['password'] = password or CONFIG['password']
     base_domain = urlparse(CONFIG['base_url']).netloc.lower()
     root_dir = Path(CONFIG['output_root'])
-    pages = []  # Collect pages for XML
 
-    visited = set()
-    queue = deque([normalize_url(CONFIG['base_url'])])
+    seen = set()  # Fingerprints of every URL ever queued, including in-flight ones
+    queue = Frontier()
+    journal = open_journal(root_dir, resume)
+    blob_store = None if CONFIG['blob_store'] is False else BlobStore(CONFIG['blob_store'] or root_dir / '.blobs')
+    file_writer = FileWriter()
+    metrics = CrawlMetrics()
+    retry_queue = RetryQueue()
+    saved_assets.clear()
+    metrics_server = await start_metrics_server(CONFIG['metrics_port']) if CONFIG['metrics_port'] else None
+    wxr = WxrWriter(root_dir / CONFIG['xml_output'], CONFIG['base_url']) if CONFIG['generate_xml'] else None
+    if resume:
+        load_journal(journal, queue, seen, base_domain, wxr)
+    enqueue_url(CONFIG['base_url'], base_domain, queue, seen, journal, source='seed')
     headers = {'User-Agent': CONFIG['user_agent']}
+    conn_stats = Counter()
 
-    ssl_context = None if not CONFIG['verify_ssl'] else ssl.create_default_context(cafile=CONFIG['ca_bundle'])
-
-    async with aiohttp.ClientSession(headers=headers, connector=aiohttp.TCPConnector(ssl=ssl_context)) as session:
+    async with aiohttp.ClientSession(headers=headers, connector=make_connector(),
+                                     trace_configs=[connection_trace(conn_stats), metrics_trace()]) as session:
         if CONFIG['username'] and CONFIG['password']:
             if await login(session, CONFIG['base_url'], CONFIG['username'], CONFIG['password']):
                 logger.info("Proceeding with authenticated session")
@@ -370,16 +1899,18 @@ async def scrape_wp_site(base_url=None, output_root=None, username=None, passwor
             logger.info("No credentials provided, crawling public content only")
 
         if CONFIG['follow_sitemap']:
-            sitemap_urls = await fetch_sitemap_urls(CONFIG['base_url'], session)
-            for url in sitemap_urls:
-                if url not in visited and is_valid_url(url, base_domain):
-                    queue.append(url)
+            rules = query_rules()
+            for url, lastmod in await fetch_sitemap_urls(CONFIG['base_url'], session):
+                enqueue_url(url, base_domain, queue, seen, journal, rules, depth=1, source='sitemap', lastmod=lastmod)
 
         if CONFIG['fetch_json']:
             json_urls = await fetch_json_urls(CONFIG['base_url'], session)
-            for url in json_urls:
-                if url not in visited and is_valid_url(url, base_domain):
-                    queue.append(url)
+            enqueue_urls(json_urls, base_domain, queue, seen, journal, depth=1, source='rest')
+
+        if CONFIG['rest_harvest']:
+            # Permalinks from the API reach content the HTML link graph may not
+            rest_links = await harvest_rest_api(CONFIG['base_url'], session, root_dir)
+            enqueue_urls(rest_links, base_domain, queue, seen, journal, depth=1, source='rest')
 
         wp_core_paths = [
             'wp-content/themes/',
@@ -389,33 +1920,58 @@ async def scrape_wp_site(base_url=None, output_root=None, username=None, passwor
             'index.php',
             'wp-blog-header.php',
         ]
-        for path in wp_core_paths:
-            abs_url = urljoin(CONFIG['base_url'], path)
-            norm_url = normalize_url(abs_url)
-            if norm_url and norm_url not in visited and is_valid_url(norm_url, base_domain):
-                queue.append(norm_url)
-
-        semaphore = asyncio.Semaphore(CONFIG['max_concurrent'])
-        async def bounded_process(url):
-            async with semaphore:
-                await process_url(url, base_domain, root_dir, session, visited, queue, pages)
-
-        tasks = []
-        while queue and len(visited) < CONFIG['max_pages']:
-            url = queue.popleft()
-            tasks.append(bounded_process(url))
-            if len(tasks) >= CONFIG['max_concurrent']:
-                await asyncio.gather(*tasks, return_exceptions=True)
-                tasks = []
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Generate XML if enabled
-        if CONFIG['generate_xml'] and pages:
-            xml_path = root_dir / CONFIG['xml_output']
-            generate_wxr_xml(pages, xml_path, CONFIG['base_url'])
-
-    logger.info(f"Completed! Crawled {len(visited)} resources.")
+        enqueue_urls((urljoin(CONFIG['base_url'], path) for path in wp_core_paths), base_domain, queue, seen, journal,
+                     source='seed')
+
+        journal.commit()
+
+        async def handle(url, url_class, depth):
+            metrics.peak('frontier_depth', queue.qsize())
+            # Retries were charged to the budget on their first dispatch
+            if not retry_queue.attempts[url] and not queue.take(url_class):
+                journal.execute("UPDATE urls SET status = 'skipped' WHERE url = ?", (url,))
+                return
+            with metrics.timer('process_url', url_class):
+                await process_url(url, base_domain, root_dir, session, seen, queue, wxr, journal, parse_pool, depth)
+            if url in retry_queue:
+                return
+            # Keep failures recorded by process_url; everything else is finished
+            journal.execute("UPDATE urls SET status = 'done' WHERE url = ? AND status = 'queued'", (url,))
+            journal.commit()
+
+        with ProcessPoolExecutor(max_workers=CONFIG['parse_workers'], initializer=init_parse_worker, initargs=(CONFIG,)) as parse_pool:
+            await run_workers(queue, handle, CONFIG['max_concurrent'], retry_queue)
+        await file_writer.close()
+
+        if wxr:
+            wxr.close()
+
+    failed = journal.execute("SELECT COUNT(*) FROM urls WHERE status = 'failed'").fetchone()[0]
+    journal.close()
+    if blob_store:
+        blob_store.close()
+    log_connection_stats(conn_stats)
+    logger.info(f"Assets: {metrics.counters[('assets', 'download')]} downloads, "
+                f"{metrics.counters[('assets', 'coalesced')]} coalesced with one in flight, "
+                f"{metrics.counters[('assets', 'registry_hit')]} served from the run registry")
+    retry_queue.report(root_dir / CONFIG['failure_report'])
+    write_metrics(root_dir, conn_stats, failed, queue)
+    if metrics_server:
+        await metrics_server.cleanup()
+    logger.info(f"Completed! Crawled {sum(queue.taken.values())} resources ({failed} failed, "
+                f"{queue.skipped} skipped over budget).")
+
+def export_wxr(base_url=None, output_root=None):
+    """Rebuild the WXR export from the page records of a previous crawl."""
+    CONFIG['base_url'] = base_url or CONFIG['base_url']
+    root_dir = Path(output_root or CONFIG['output_root'])
+    journal_path = root_dir / CONFIG['journal_file']
+    if not journal_path.exists():
+        logger.error(f"No crawl journal at {journal_path}; run a crawl first")
+        return
+    journal = open_journal(root_dir, resume=True)
+    generate_wxr_xml(iter_pages(journal), root_dir / CONFIG['xml_output'], CONFIG['base_url'])
+    journal.close()
 
 def parse_args():
     """Parse command-line arguments."""
@@ -427,6 +1983,9 @@ def parse_args():
     parser.add_argument('--config', default='config.json', help='Path to configuration JSON file')
     parser.add_argument('--no-ssl-verify', action='store_true', help='Disable SSL verification (insecure)')
     parser.add_argument('--no-xml', action='store_true', help='Disable XML generation')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted crawl from its journal in output_root')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port while crawling')
+    parser.add_argument('--export-only', action='store_true', help='Rebuild the WXR export from the journal without crawling')
     return parser.parse_args()
 
 async def main():
@@ -437,7 +1996,12 @@ async def main():
         CONFIG['verify_ssl'] = False
     if args.no_xml:
         CONFIG['generate_xml'] = False
-    await scrape_wp_site(args.base_url, args.output_root, args.username, args.password)
+    if args.metrics_port:
+        CONFIG['metrics_port'] = args.metrics_port
+    if args.export_only:
+        export_wxr(args.base_url, args.output_root)
+        return
+    await scrape_wp_site(args.base_url, args.output_root, args.username, args.password, args.resume)
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file